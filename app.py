@@ -4,13 +4,17 @@ from typing import Optional
 
 from tkinter import Tk, Frame, Button, Label
 
-from grid import HexGrid, HexGridResultFlag
+from grid import HexGrid, HexGridResultFlag, HintQuery
 from grid_canvas import HexGridCanvas
+from hint_worker import HintWorker
+from planner import BeamSearchPlanner, Plan
+from render_scheduler import RenderScheduler
 from tile_canvas import HexTileCanvas
 from tile import HexTile, TileStatus
 from edge import Edge
 
-from utils import Color, MANUAL_SAVE_FILEPATH, AUTO_SAVE_FILEPATH, SAVE_DIR
+from profiling import Profiler
+from utils import Color, MANUAL_SAVE_FILEPATH, PROFILE_FILEPATH, SAVE_DIR
 
 
 class DorfHelperApp(Tk):
@@ -20,12 +24,21 @@ class DorfHelperApp(Tk):
         width: int,
         height: int,
         layout: int,
+        profiler: Optional[Profiler] = None,
         *args,
         **kwargs
     ) -> None:
         Tk.__init__(self, *args, **kwargs)
 
+        self.profiler = profiler
+        if self.profiler is not None:
+            self.profiler.enable()
+
         self.board = HexGrid(save_file=save_file)
+        self.render_scheduler = RenderScheduler(self)
+        self.hint_worker = HintWorker(self)
+        self.planner = BeamSearchPlanner()
+        self.tile_queue = []
 
         self.board_frame = Frame(self, background=Color.PASTEL_YELLOW, bd=1, relief="sunken")
         self.tile_frame = Frame(self, background=Color.PASTEL_BLUE, bd=1, relief="sunken")
@@ -52,25 +65,38 @@ class DorfHelperApp(Tk):
             self.columnconfigure(0, minsize=500)
             self.rowconfigure(2, minsize=200)
 
-        self.tile_canvas = HexTileCanvas(self.tile_frame, size=tile_canvas_size)
+        self.tile_canvas = HexTileCanvas(self.tile_frame, size=tile_canvas_size, scheduler=self.render_scheduler)
         self.tile_canvas.bind('<Button-1>', self.tile_canvas.on_click)
         self.tile_canvas.grid(row=0, column=0, padx=5, pady=5)
         self.tile_canvas.grid(row=0, column=0)
 
-        self.board_canvas = HexGridCanvas(self.board_frame, width=board_canvas_width, height=board_canvas_height)
+        self.board_canvas = HexGridCanvas(self.board_frame, width=board_canvas_width, height=board_canvas_height,
+                                          scheduler=self.render_scheduler)
         self.board_canvas.bind('<Button-1>', self.board_canvas_click)
+        for sequence in ['<MouseWheel>', '<Button-4>', '<Button-5>']:
+            self.board_canvas.bind(sequence, self.board_canvas_zoom)
+        for button in [2, 3]:
+            self.board_canvas.bind('<ButtonPress-{}>'.format(button), self.board_canvas.on_pan_start)
+            self.board_canvas.bind('<B{}-Motion>'.format(button), self.board_canvas_pan)
         self.board_canvas.grid(row=0, column=0, padx=5, pady=5)
-        self.board_canvas.draw(self.board)
+        self.board_canvas.request_draw(self.board)
 
         board_controls = []
         frame = self.control_frame
         board_controls.append(Button(frame, text="Place",       command=self.place_tile))
         board_controls.append(Button(frame, text="Hint",        command=self.display_hint))
+        board_controls.append(Button(frame, text="Queue",       command=self.queue_tile))
+        board_controls.append(Button(frame, text="Plan",        command=self.display_plan))
+        board_controls.append(Button(frame, text="Clear Queue", command=self.clear_queue))
         board_controls.append(Button(frame, text="Sample",      command=self.sample_tile))
         board_controls.append(Button(frame, text="Remove",      command=self.remove_tile))
         board_controls.append(Button(frame, text="Undo",        command=self.undo))
+        board_controls.append(Button(frame, text="Redo",        command=self.redo))
         board_controls.append(Button(frame, text="Stats",       command=self.display_stats))
+        if self.profiler is not None:
+            board_controls.append(Button(frame, text="Profile", command=self.display_profile))
         board_controls.append(Button(frame, text="Toggle View", command=self.toggle_view))
+        board_controls.append(Button(frame, text="Fit View",    command=self.fit_view))
         board_controls.append(Button(frame, text="Save",        command=self.manual_save))
         board_controls.append(Button(frame, text="Quit",        command=self.correct_quit))
         for i, button in enumerate(board_controls):
@@ -101,8 +127,6 @@ class DorfHelperApp(Tk):
         self.log = Label(self.textlog_frame, text="")
         self.log.pack()
 
-        self.can_undo = False
-
 
     def board_canvas_click(self, event) -> None:
         """Handles the event when the board canvas is clicked"""
@@ -118,8 +142,18 @@ class DorfHelperApp(Tk):
             connections = HexTile(HexTile.EMPTY_EDGES)
         self.tile_canvas.set_neighbors(connections)
 
-        self.board_canvas.draw(self.board)
-        self.tile_canvas.draw()
+        self.board_canvas.request_draw(self.board)
+        self.tile_canvas.request_draw()
+
+
+    def board_canvas_zoom(self, event) -> None:
+        self.board_canvas.on_mouse_wheel(event)
+        self.board_canvas.request_draw(self.board)
+
+
+    def board_canvas_pan(self, event) -> None:
+        self.board_canvas.on_pan_drag(event)
+        self.board_canvas.request_draw(self.board)
 
 
     def manual_save(self) -> None:
@@ -128,13 +162,25 @@ class DorfHelperApp(Tk):
 
 
     def undo(self) -> None:
-        if not self.can_undo:
+        if self.board.undo() == HexGridResultFlag.ERROR:
             self.log.config(text="ERROR: Unable to undo move")
             return
-        self.board.load(AUTO_SAVE_FILEPATH)
-        self.board_canvas.draw(self.board)
-        self.log.config(text="Removed last placed tile")
-        self.can_undo = False
+        self.board_canvas.set_selected_hex(None)
+        self.board_canvas.set_hint(None)
+        self.hint_worker.cancel() # Hints for the previous board are stale
+        self.board_canvas.request_draw(self.board)
+        self.log.config(text="Undid last move")
+
+
+    def redo(self) -> None:
+        if self.board.redo() == HexGridResultFlag.ERROR:
+            self.log.config(text="ERROR: Unable to redo move")
+            return
+        self.board_canvas.set_selected_hex(None)
+        self.board_canvas.set_hint(None)
+        self.hint_worker.cancel() # Hints for the previous board are stale
+        self.board_canvas.request_draw(self.board)
+        self.log.config(text="Redid last undone move")
 
 
     def place_tile(self) -> None:
@@ -142,22 +188,22 @@ class DorfHelperApp(Tk):
             self.log.config(text="ERROR: no selected tile")
             return
         xy = self.board_canvas.selected_hex
-        if self.board.get_tile(xy).get_status() != TileStatus.VALID:
-            self.log.config(text="ERROR: Illegal tile placement at {}".format(xy))
-            return
-        self.board.save(AUTO_SAVE_FILEPATH)
-        self.can_undo = True
         tile = self.tile_canvas.get_tile()
+        check = self.board.validate_placement(xy, tile)
+        if not check:
+            self.log.config(text="ERROR: Illegal tile placement at {}: {}".format(xy, check))
+            return
         result = self.board.place_tile(xy, tile)
         if result == HexGridResultFlag.ERROR:
             self.log.config(text="ERROR: Illegal tile placement at {}".format(xy))
             return
         self.board_canvas.set_selected_hex(None)
         self.board_canvas.set_hint(None)
-        self.tile_canvas.tile.set_edges(HexTile.ORIGIN_EDGES)
+        self.hint_worker.cancel() # Hints for the previous board are stale
+        self.tile_canvas.set_tile(HexTile(HexTile.ORIGIN_EDGES))
         self.tile_canvas.set_neighbors(HexTile(HexTile.EMPTY_EDGES))
-        self.board_canvas.draw(self.board)
-        self.tile_canvas.draw()
+        self.board_canvas.request_draw(self.board)
+        self.tile_canvas.request_draw()
         self.log.config(text="Placed tile at {}".format(xy))
 
 
@@ -169,12 +215,11 @@ class DorfHelperApp(Tk):
         if self.board.get_tile(xy).is_empty():
             self.log.config(text="ERROR: Illegal tile removal at {}".format(xy))
             return
-        self.board.save(AUTO_SAVE_FILEPATH)
-        self.can_undo = True
         self.board.remove_tile(xy)
         self.board_canvas.set_selected_hex(None)
         self.board_canvas.set_hint(None)
-        self.board_canvas.draw(self.board)
+        self.hint_worker.cancel() # Hints for the previous board are stale
+        self.board_canvas.request_draw(self.board)
         self.log.config(text="Removed tile at {}".format(xy))
 
 
@@ -183,58 +228,124 @@ class DorfHelperApp(Tk):
             self.log.config(text="ERROR: No selected hex to sample")
             return
         xy = self.board_canvas.selected_hex
-        if self.board.tiles[xy].status == TileStatus.VALID:
+        if self.board.get_tile(xy).get_status() == TileStatus.VALID:
             self.log.config(text="ERROR: Illegal tile sample at {}".format(xy))
             return
-        edges = self.board.get_tile(xy).get_edges()
-        self.tile_canvas.tile.set_edges(edges)
-        self.tile_canvas.draw()
+        self.tile_canvas.set_tile(self.board.get_tile(xy).to_tile())
+        self.tile_canvas.request_draw()
         self.log.config(text="Tile sampled at {}".format(xy))
 
 
     def display_hint(self) -> None:
         tile = self.tile_canvas.get_tile()
-        hint = self.board.get_hint(tile, threshold=2, top_k=10)
-        if not hint:
-            hint = self.board.get_hint(tile, top_k=5)
+        # Good placements if there are any, otherwise the best few
+        queries = [HintQuery(top_k=10, threshold=2), HintQuery(top_k=5)]
+        self.hint_worker.request(self.board, tile, queries, self.show_hint, self.show_hint_error)
+        self.log.config(text="Computing hint...")
+
+
+    def show_hint(self, hints) -> None:
+        hint = hints[0] if hints[0] else hints[1]
         text_hint = ["x={}, y={}, {} of {} good connections with {} perfects (score = {})".format(
-                            evaluator.xy[0],
-                            evaluator.xy[1],
-                            evaluator.get_num_good_connections(),
-                            evaluator.get_num_good_connections() + evaluator.get_num_bad_connections(),
-                            evaluator.get_num_neighbors_perfected() + (evaluator.get_num_good_connections() == 6),
-                            evaluator.get_score()) \
-                            for evaluator in hint]
+                            evaluation.xy[0],
+                            evaluation.xy[1],
+                            evaluation.num_good_connections,
+                            evaluation.num_connections,
+                            evaluation.num_perfects,
+                            evaluation.score) \
+                            for evaluation in hint]
         text_hint = "\n".join(text_hint)
         self.log.config(text=text_hint)
         self.board_canvas.set_hint(hint)
-        self.board_canvas.draw(self.board)
+        self.board_canvas.request_draw(self.board)
     
 
+    def show_hint_error(self, error: Exception) -> None:
+        self.log.config(text="ERROR: Could not compute hint: {}".format(error))
+
+
+    def queue_tile(self) -> None:
+        self.tile_queue.append(self.tile_canvas.get_tile())
+        self.log.config(text="{} tiles in the queue".format(len(self.tile_queue)))
+
+
+    def clear_queue(self) -> None:
+        self.tile_queue = []
+        self.log.config(text="Cleared the tile queue")
+
+
+    def display_plan(self) -> None:
+        if not self.tile_queue:
+            self.log.config(text="ERROR: No queued tiles to plan for")
+            return
+        tiles = list(self.tile_queue)
+        self.hint_worker.request_plan(self.board, self.planner, tiles, lambda plan: self.show_plan(plan, len(tiles)),
+                                      self.show_plan_error)
+        self.log.config(text="Planning...")
+
+
+    def show_plan(self, plan: Plan, num_tiles: int) -> None:
+        text_plan = ["{}. x={}, y={}, {} of {} good connections with {} perfects (score = {})".format(
+                            step + 1,
+                            evaluation.xy[0],
+                            evaluation.xy[1],
+                            evaluation.num_good_connections,
+                            evaluation.num_connections,
+                            evaluation.num_perfects,
+                            evaluation.score) \
+                            for step, evaluation in enumerate(plan.placements)]
+        text_plan.append("Planned {} of {} tiles (total score = {})".format(
+            len(plan.placements), num_tiles, plan.score))
+        self.log.config(text="\n".join(text_plan))
+        self.board_canvas.set_hint(plan.placements)
+        self.board_canvas.request_draw(self.board)
+
+
+    def show_plan_error(self, error: Exception) -> None:
+        self.log.config(text="ERROR: Could not plan: {}".format(error))
+
+
     def toggle_view(self) -> None:
         self.board_canvas.toggle_view()
-        self.board_canvas.draw(self.board)
+        self.board_canvas.request_draw(self.board)
+
+
+    def fit_view(self) -> None:
+        self.board_canvas.fit_view()
+        self.board_canvas.request_draw(self.board)
 
 
     def display_stats(self) -> None:
-        num_good = len(self.board.get_locations_with_status(TileStatus.GOOD))
-        num_perfect = len(self.board.get_locations_with_status(TileStatus.PERFECT))
-        num_BAD = len(self.board.get_locations_with_status(TileStatus.BAD))
-        num_valid = len(self.board.get_locations_with_status(TileStatus.VALID))
+        num_good = self.board.get_num_locations_with_status(TileStatus.GOOD)
+        num_perfect = self.board.get_num_locations_with_status(TileStatus.PERFECT)
+        num_BAD = self.board.get_num_locations_with_status(TileStatus.BAD)
+        num_valid = self.board.get_num_locations_with_status(TileStatus.VALID)
         text = "{} tiles placed\n".format(num_good+num_perfect+num_BAD-1)
         text += "{} perfect tiles\n".format(num_perfect)
         text += "{} bad tiles\n".format(num_BAD)
         text += "{} legal tile locations\n".format(num_valid)
+        text += "{} of {} requested redraws performed\n".format(self.render_scheduler.num_performed,
+                                                               self.render_scheduler.num_requested)
         self.log.config(text=text)
 
 
+    def display_profile(self) -> None:
+        self.profiler.dump(PROFILE_FILEPATH)
+        text = self.profiler.format_stats() or "No profiled calls yet"
+        self.log.config(text=text + "\nSaved to {}".format(PROFILE_FILEPATH))
+
+
     def correct_quit(self) -> None:
+        if self.profiler is not None:
+            self.profiler.dump(PROFILE_FILEPATH)
+        self.hint_worker.shutdown()
         self.destroy()
         self.quit()
 
 
-def main(save_file: Optional[str], width: int, height: int, layout: int) -> None:
-    app = DorfHelperApp(save_file=save_file, width=width, height=height, layout=args.layout)
+def main(save_file: Optional[str], width: int, height: int, layout: int, profile: bool) -> None:
+    profiler = Profiler() if profile else None
+    app = DorfHelperApp(save_file=save_file, width=width, height=height, layout=args.layout, profiler=profiler)
     app.mainloop()
 
 
@@ -244,6 +355,7 @@ if __name__ == '__main__':
     parser.add_argument('--height', '-y', type=int, default=1300, help="Pixel height of the board display")
     parser.add_argument('--width', '-x', type=int, default=1500, help="Pixel width of the board display")
     parser.add_argument('--layout', type=int, default=0, help="Layout of the widgets in the window")
+    parser.add_argument('--profile', action='store_true', help="Time the hot paths, see the Profile button")
     args = parser.parse_args()
 
     assert(args.layout in [0, 1])
@@ -252,6 +364,6 @@ if __name__ == '__main__':
     if not os.path.exists(SAVE_DIR):
         os.mkdir(SAVE_DIR)
 
-    main(save_file=save_file, width=args.width, height=args.height, layout=args.layout)
+    main(save_file=save_file, width=args.width, height=args.height, layout=args.layout, profile=args.profile)
 
     
\ No newline at end of file
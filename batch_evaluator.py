@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import numpy as np
+from typing import List, Tuple, Optional
+
+from edge import are_legal_connections, are_good_connections
+from evaluator import PlacementEvaluation, compute_score
+from tile import HexTile
+from utils import GridCoordinate
+
+
+def select_best(scores: np.ndarray, top_k: Optional[int] = None, threshold: Optional[float] = None) -> np.ndarray:
+    """
+    Returns the indices of the best scores, best first, with ties kept in index order
+
+    Only scores of at least threshold are kept, and at most top_k of them. The top_k cut uses a
+    partition of the scores, so only the selected scores are ever sorted.
+    """
+    candidates = np.arange(len(scores))
+    if threshold is not None:
+        candidates = np.nonzero(scores >= threshold)[0]
+    if top_k is not None and top_k < len(candidates):
+        if top_k <= 0:
+            return candidates[:0]
+        candidate_scores = scores[candidates]
+        cutoff = -np.partition(-candidate_scores, top_k-1)[top_k-1] # Score of the k-th best candidate
+        above = np.nonzero(candidate_scores > cutoff)[0]
+        at = np.nonzero(candidate_scores == cutoff)[0][:top_k-len(above)]
+        candidates = candidates[np.sort(np.concatenate([above, at]))]
+    # Stable sort so that ties keep index order
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class BatchPlacementEvaluator:
+    """
+    Evaluates every rotation of a tile at many board locations at once
+
+    The neighborhood of each location is described by arrays of shape (locations, 6), where
+    column i describes the neighbor across edge i of the placed tile:
+        neighbor_edges     -- code of the neighbor's edge facing the placed tile
+        neighbor_empty     -- whether the neighbor is empty
+        neighbor_num_good  -- number of good connections the neighbor already has
+        neighbor_is_good   -- whether the neighbor currently has the GOOD status
+    All metrics are arrays of shape (locations, rotations) and match PlacementEvaluator.
+    """
+
+    def __init__(
+        self,
+        tile: HexTile,
+        xys: List[GridCoordinate],
+        neighbor_edges: np.ndarray,
+        neighbor_empty: np.ndarray,
+        neighbor_num_good: np.ndarray,
+        neighbor_is_good: np.ndarray
+    ) -> None:
+        self.tile = tile
+        self.xys = xys
+        rotation_table = tile.get_rotation_table()
+        self.rotations = rotation_table.tiles
+        # Index as (location, rotation, edge)
+        tile_edges = rotation_table.edge_codes[np.newaxis, :, :]
+        neighbor_edges = neighbor_edges[:, np.newaxis, :]
+        neighbor_empty = neighbor_empty[:, np.newaxis, :]
+        good = are_good_connections(tile_edges, neighbor_edges)
+        self._set_metrics(are_legal_connections(tile_edges, neighbor_edges).all(axis=2),
+                          good.sum(axis=2),
+                          (~good & ~neighbor_empty).sum(axis=2),
+                          (good & (neighbor_num_good == 5)[:, np.newaxis, :]).sum(axis=2),
+                          (~good & neighbor_is_good[:, np.newaxis, :]).sum(axis=2))
+
+
+    def _set_metrics(
+        self,
+        legal: np.ndarray,
+        num_good_connections: np.ndarray,
+        num_bad_connections: np.ndarray,
+        num_neighbors_perfected: np.ndarray,
+        num_neighbors_ruined: np.ndarray
+    ) -> None:
+        self.legal = legal
+        self.num_good_connections = num_good_connections
+        self.num_bad_connections = num_bad_connections
+        self.num_neighbors_perfected = num_neighbors_perfected
+        self.num_neighbors_ruined = num_neighbors_ruined
+        self.scores = compute_score(num_good_connections, num_bad_connections,
+                                    num_neighbors_perfected, num_neighbors_ruined)
+
+
+    @classmethod
+    def from_metrics(cls, tile: HexTile, xys: List[GridCoordinate], metrics: np.ndarray) -> BatchPlacementEvaluator:
+        """Rebuilds a batch from a (locations, 5, rotations) array as returned by get_metrics"""
+        batch = cls.__new__(cls)
+        batch.tile = tile
+        batch.xys = xys
+        batch.rotations = tile.get_rotation_table().tiles
+        metrics = metrics.reshape(len(xys), 5, len(batch.rotations))
+        batch._set_metrics(metrics[:, 0].astype(bool), metrics[:, 1], metrics[:, 2], metrics[:, 3], metrics[:, 4])
+        return batch
+
+
+    def get_metrics(self) -> np.ndarray:
+        """Returns the legality and counts of every placement as one (locations, 5, rotations) array"""
+        return np.stack([self.legal,
+                         self.num_good_connections,
+                         self.num_bad_connections,
+                         self.num_neighbors_perfected,
+                         self.num_neighbors_ruined], axis=1).astype(np.int8)
+
+
+    def get_evaluation(self, location: int, rotation: int) -> PlacementEvaluation:
+        """Returns the evaluation record of one placement in the batch"""
+        placement = (location, rotation)
+        return PlacementEvaluation(self.xys[location],
+                                   self.rotations[rotation],
+                                   int(self.num_good_connections[placement]),
+                                   int(self.num_bad_connections[placement]),
+                                   int(self.num_neighbors_perfected[placement]),
+                                   int(self.num_neighbors_ruined[placement]),
+                                   float(self.scores[placement]))
+
+
+    def get_ranking(self, top_k: Optional[int] = None, threshold: Optional[float] = None) -> List[Tuple[int, int]]:
+        """
+        Returns (location index, rotation index) pairs of the best legal placements, best first
+
+        Ties keep location-major order, like sorting the list of all legal placements would.
+        """
+        locations, rotations = np.nonzero(self.legal)
+        order = select_best(self.scores[locations, rotations], top_k, threshold)
+        return list(zip(locations[order].tolist(), rotations[order].tolist()))
@@ -0,0 +1,131 @@
+import argparse
+import json
+import numpy as np
+import os
+import platform
+import tempfile
+import time
+from typing import Dict, List
+
+from grid import HexGrid
+from simulator import Simulator, TileGenerator
+from tile import TileStatus
+
+
+"""
+Throughput benchmark of the board hot paths, played headlessly by the simulator
+
+Reports placement throughput, hint latency percentiles as the board grows, memory per tile and
+save/load times, and writes them to a JSON file so that versions can be compared.
+"""
+
+
+def get_percentiles(times: List[float]) -> Dict[str, float]:
+    """Returns latency percentiles in milliseconds"""
+    return {"p{}".format(q): 1000 * float(np.percentile(times, q)) for q in [50, 90, 99]}
+
+
+def measure_hints(board: HexGrid, generator: TileGenerator, num_samples: int) -> Dict[str, Dict[str, float]]:
+    """Times get_hint for random tiles, with the hint cache cleared (cold) and filled (warm)"""
+    tiles = [generator.next_tile() for _ in range(num_samples)]
+    cold, warm = [], []
+    for tile in tiles:
+        board.hint_cache.clear()
+        start = time.perf_counter()
+        board.get_hint(tile, top_k=10)
+        cold.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        board.get_hint(tile, top_k=10)
+        warm.append(time.perf_counter() - start)
+    return {"cold_ms": get_percentiles(cold), "warm_ms": get_percentiles(warm)}
+
+
+def measure_memory(board: HexGrid, num_tiles: int) -> Dict[str, float]:
+    """Returns the bytes used by the board arrays, in total and per placed tile"""
+    arrays = [board.edges, board.statuses, board.num_good_connections, board.num_bad_connections,
+              board.num_empty_neighbors]
+    num_bytes = sum(array.nbytes for array in arrays)
+    return {"array_bytes": num_bytes, "array_bytes_per_tile": num_bytes / num_tiles}
+
+
+def measure_save_load(board: HexGrid, num_repeats: int) -> Dict[str, float]:
+    """Times saving and loading the board through a temporary file"""
+    handle, file_name = tempfile.mkstemp(suffix=".dorf")
+    os.close(handle)
+    try:
+        save_times, load_times = [], []
+        for _ in range(num_repeats):
+            start = time.perf_counter()
+            board.save(file_name)
+            save_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            HexGrid(save_file=file_name)
+            load_times.append(time.perf_counter() - start)
+        return {"file_bytes": os.path.getsize(file_name),
+                "save_ms": 1000 * min(save_times),
+                "load_ms": 1000 * min(load_times)}
+    finally:
+        os.remove(file_name)
+
+
+def run_benchmark(num_tiles: int, checkpoint: int, policy: str, seed: int, num_samples: int) -> dict:
+    simulator = Simulator(policy=policy, seed=seed)
+    sample_generator = TileGenerator(seed=seed + 1)
+    board = simulator.board
+    checkpoints = []
+    num_placed = num_skipped = 0
+    play_time = 0
+    while num_placed + num_skipped < num_tiles:
+        num_steps = min(checkpoint, num_tiles - num_placed - num_skipped)
+        start = time.perf_counter()
+        result = simulator.play(num_steps)
+        elapsed = time.perf_counter() - start
+        play_time += elapsed
+        num_placed += result.num_placed
+        num_skipped += result.num_skipped
+        checkpoints.append({"num_tiles": num_placed + 1, # Including the origin tile
+                            "board_size": board.size,
+                            "frontier_size": board.get_num_locations_with_status(TileStatus.VALID),
+                            "placements_per_sec": result.num_placed / elapsed,
+                            "hint": measure_hints(board, sample_generator, num_samples),
+                            "memory": measure_memory(board, num_placed + 1)})
+    return {"config": {"num_tiles": num_tiles, "checkpoint": checkpoint, "policy": policy, "seed": seed,
+                       "num_samples": num_samples},
+            "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                            "machine": platform.machine()},
+            "num_placed": num_placed,
+            "num_skipped": num_skipped,
+            "placements_per_sec": num_placed / play_time,
+            "checkpoints": checkpoints,
+            "save_load": measure_save_load(board, num_repeats=5)}
+
+
+def print_summary(results: dict) -> None:
+    print("{} tiles placed ({} skipped) at {:.0f} placements/s".format(
+        results["num_placed"], results["num_skipped"], results["placements_per_sec"]))
+    print("{:>8} {:>6} {:>9} {:>12} {:>12} {:>12} {:>12}".format(
+        "tiles", "size", "frontier", "placed/s", "cold p50 ms", "cold p99 ms", "bytes/tile"))
+    for checkpoint in results["checkpoints"]:
+        print("{:>8} {:>6} {:>9} {:>12.0f} {:>12.3f} {:>12.3f} {:>12.1f}".format(
+            checkpoint["num_tiles"], checkpoint["board_size"], checkpoint["frontier_size"],
+            checkpoint["placements_per_sec"], checkpoint["hint"]["cold_ms"]["p50"],
+            checkpoint["hint"]["cold_ms"]["p99"], checkpoint["memory"]["array_bytes_per_tile"]))
+    save_load = results["save_load"]
+    print("save {:.2f} ms, load {:.2f} ms, {} bytes".format(
+        save_load["save_ms"], save_load["load_ms"], save_load["file_bytes"]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the board hot paths on simulated games")
+    parser.add_argument('--tiles', '-n', type=int, default=2000, help="Number of tiles to draw")
+    parser.add_argument('--checkpoint', '-c', type=int, default=250, help="Tiles drawn between measurements")
+    parser.add_argument('--policy', choices=Simulator.POLICIES, default="greedy", help="How tiles are placed")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the tile generator")
+    parser.add_argument('--samples', type=int, default=20, help="Hint requests timed at each measurement")
+    parser.add_argument('--output', '-o', default="benchmark.json", help="JSON file to write the results to")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.tiles, args.checkpoint, args.policy, args.seed, args.samples)
+    print_summary(results)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
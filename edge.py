@@ -1,5 +1,6 @@
 from enum import Enum, auto
 from typing import List
+import numpy as np
 
 from utils import Color
 
@@ -26,10 +27,23 @@ class Edge(Enum):
                   STATION: Color.PURPLE}
 
 
+    def __init__(self, value: int) -> None:
+        self.code = value - 1 # Compact integer code used to index the connection tables
+
+
     def to_color(self) -> Color:
         return self.__COLORS__[self.value]
 
 
+    @staticmethod
+    def from_code(code: int) -> 'Edge':
+        return EDGES_BY_CODE[code]
+
+
+EDGES_BY_CODE = list(Edge)
+NUM_EDGE_CODES = len(EDGES_BY_CODE)
+
+
 
 class Connection:
     __ILLEGAL_CONNECTIONS__ = [set([Edge.RIVER, Edge.GRASS]),
@@ -69,8 +83,48 @@ class Connection:
 
 
     def is_legal(self) -> bool:
-        return not set(self.edges) in self.__ILLEGAL_CONNECTIONS__
+        edgeA, edgeB = self.edges
+        return is_legal_connection(edgeA.code, edgeB.code)
 
 
     def is_good(self) -> bool:
-        return set(self.edges) in self.__GOOD_CONNECTIONS__
+        edgeA, edgeB = self.edges
+        return is_good_connection(edgeA.code, edgeB.code)
+
+
+def _build_connection_table(connections: List[set], default: bool) -> np.ndarray:
+    """Builds a symmetric lookup table indexed by the codes of two connecting edges"""
+    table = np.full((NUM_EDGE_CODES, NUM_EDGE_CODES), default, dtype=bool)
+    for connection in connections:
+        edgeA, edgeB = 2*list(connection) if len(connection) == 1 else list(connection)
+        table[edgeA.code, edgeB.code] = not default
+        table[edgeB.code, edgeA.code] = not default
+    return table
+
+
+LEGAL_CONNECTION_TABLE = _build_connection_table(Connection.__ILLEGAL_CONNECTIONS__, default=True)
+GOOD_CONNECTION_TABLE = _build_connection_table(Connection.__GOOD_CONNECTIONS__, default=False)
+
+# Nested lists are faster than numpy arrays for scalar lookups
+_LEGAL_CONNECTIONS = LEGAL_CONNECTION_TABLE.tolist()
+_GOOD_CONNECTIONS = GOOD_CONNECTION_TABLE.tolist()
+
+
+def is_legal_connection(codeA: int, codeB: int) -> bool:
+    """Checks if two edges (given by their codes) may legally be placed next to each other"""
+    return _LEGAL_CONNECTIONS[codeA][codeB]
+
+
+def is_good_connection(codeA: int, codeB: int) -> bool:
+    """Checks if two edges (given by their codes) form a good connection"""
+    return _GOOD_CONNECTIONS[codeA][codeB]
+
+
+def are_legal_connections(codesA: np.ndarray, codesB: np.ndarray) -> np.ndarray:
+    """Vectorized form of is_legal_connection for arrays of edge codes"""
+    return LEGAL_CONNECTION_TABLE[codesA, codesB]
+
+
+def are_good_connections(codesA: np.ndarray, codesB: np.ndarray) -> np.ndarray:
+    """Vectorized form of is_good_connection for arrays of edge codes"""
+    return GOOD_CONNECTION_TABLE[codesA, codesB]
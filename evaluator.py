@@ -1,18 +1,49 @@
 from enum import Flag, auto
 import numpy as np
 import os
-from typing import Optional, List, Tuple, Callable
+from typing import Optional, List, Tuple, Callable, NamedTuple
 
-from edge import Edge, Connection
+from edge import Edge, Connection, is_good_connection
 from tile import HexTile, TileStatus
 from utils import GridCoordinate
 
 
+class PlacementEvaluation(NamedTuple):
+    """The metrics of a single tile placement, computed once and reused for ranking and display"""
+    xy: GridCoordinate
+    tile: HexTile
+    num_good_connections: int
+    num_bad_connections: int
+    num_neighbors_perfected: int
+    num_neighbors_ruined: int
+    score: float
+
+    @property
+    def num_connections(self) -> int:
+        return self.num_good_connections + self.num_bad_connections
+
+    @property
+    def num_perfects(self) -> int:
+        """Number of tiles made perfect by the placement, including the placed tile itself"""
+        return self.num_neighbors_perfected + (self.num_good_connections == 6)
+
+
+def compute_score(
+    num_good_connections: int,
+    num_bad_connections: int,
+    num_neighbors_perfected: int,
+    num_neighbors_ruined: int
+) -> float:
+    num_perfects = num_neighbors_perfected + (num_good_connections == 6)
+    return 0.5*num_perfects + num_good_connections - num_neighbors_ruined - 0.5*num_bad_connections
+
+
 class PlacementEvaluator:
     def __init__(self, tile: HexTile, xy: GridCoordinate, neighborTiles: List[HexTile]) -> None:
         self.tile = tile
         self.xy = xy
         self.neighborTiles = neighborTiles
+        self.evaluation = None
 
 
     def zip_neighbor_tiles_and_connections(self) -> List[Tuple[HexTile, Connection]]:
@@ -25,30 +56,42 @@ class PlacementEvaluator:
         return result
 
 
+    def evaluate(self) -> PlacementEvaluation:
+        """Computes all metrics of the placement in a single pass over the neighbors"""
+        if self.evaluation is not None:
+            return self.evaluation
+        num_good_connections = num_bad_connections = 0
+        num_neighbors_perfected = num_neighbors_ruined = 0
+        for index, neighborTile in enumerate(self.neighborTiles):
+            index_ = (index + 3) % 6
+            if is_good_connection(self.tile.get_edge(index).code, neighborTile.get_edge(index_).code):
+                num_good_connections += 1
+                num_neighbors_perfected += neighborTile.num_good_connections == 5
+            else:
+                num_bad_connections += not neighborTile.is_empty()
+                num_neighbors_ruined += neighborTile.get_status() == TileStatus.GOOD
+        score = compute_score(num_good_connections, num_bad_connections,
+                              num_neighbors_perfected, num_neighbors_ruined)
+        self.evaluation = PlacementEvaluation(self.xy, self.tile, num_good_connections, num_bad_connections,
+                                              num_neighbors_perfected, num_neighbors_ruined, score)
+        return self.evaluation
+
+
     def get_num_good_connections(self) -> int:
-        return sum([connection.is_good() \
-                        for _, connection in self.zip_neighbor_tiles_and_connections()])
+        return self.evaluate().num_good_connections
 
 
     def get_num_bad_connections(self) -> int:
-        return sum([not connection.is_good() and not neighborTile.is_empty() \
-                        for neighborTile, connection in self.zip_neighbor_tiles_and_connections()])
+        return self.evaluate().num_bad_connections
 
 
     def get_num_neighbors_perfected(self) -> int:
-        return sum([connection.is_good() and neighborTile.num_good_connections == 5 \
-                        for neighborTile, connection in self.zip_neighbor_tiles_and_connections()])
+        return self.evaluate().num_neighbors_perfected
 
 
     def get_num_neighbors_ruined(self) -> int:
-        return sum([not connection.is_good() and neighborTile.get_status() == TileStatus.GOOD \
-                        for neighborTile, connection in self.zip_neighbor_tiles_and_connections()])
+        return self.evaluate().num_neighbors_ruined
 
 
     def get_score(self) -> float:
-        num_good_connections = self.get_num_good_connections()
-        num_bad_connections = self.get_num_bad_connections()
-        num_perfects = self.get_num_neighbors_perfected() + (num_good_connections == 6)
-        num_neighbors_ruined = self.get_num_neighbors_ruined()
-        return 0.5*num_perfects + num_good_connections - num_neighbors_ruined - 0.5*num_bad_connections
-        
\ No newline at end of file
+        return self.evaluate().score
@@ -1,14 +1,33 @@
-from enum import Flag, auto
-from typing import Optional, Tuple, List
+from __future__ import annotations
+
+import copy
+from collections import Counter
+from enum import Enum, Flag, auto
+from typing import Optional, Tuple, List, NamedTuple
 import numpy as np
-from itertools import product
-import pickle
 
 
-from edge import Edge, Connection
-from tile import HexTile, TileStatus
-from evaluator import PlacementEvaluator
+from edge import Edge, NUM_EDGE_CODES, are_good_connections, is_legal_connection, is_good_connection
+from tile import HexTile, HexTileView, TileStatus, TILE_STATUSES_BY_VALUE
+from evaluator import PlacementEvaluator, PlacementEvaluation
+from batch_evaluator import BatchPlacementEvaluator
+from hint_cache import HintCache
+from save_format import SaveFormatError, make_records, write_board, encode_board, read_board, decode_board, is_board_save_file, read_legacy_board
 from utils import GridCoordinate, EdgeIndex
+from zobrist import get_tile_key
+
+
+# Offsets from a location to each of its neighbors, in edge index order
+NEIGHBOR_OFFSETS_X = np.array([-1, 0, 1, 1, 0, -1])
+NEIGHBOR_OFFSETS_Y = np.array([0, -1, -1, 0, 1, 1])
+OPPOSITE_EDGE_INDICES = (np.arange(6) + 3) % 6
+# Offsets of a location and its neighbors, whose statuses a placement at the location can change
+PATCH_OFFSETS_X = np.concatenate([[0], NEIGHBOR_OFFSETS_X])
+PATCH_OFFSETS_Y = np.concatenate([[0], NEIGHBOR_OFFSETS_Y])
+_NEIGHBOR_OFFSETS = list(zip(NEIGHBOR_OFFSETS_X.tolist(), NEIGHBOR_OFFSETS_Y.tolist()))
+_PATCH_OFFSETS = list(zip(PATCH_OFFSETS_X.tolist(), PATCH_OFFSETS_Y.tolist()))
+_EMPTY_VALUE, _GOOD_VALUE, _PERFECT_VALUE, _BAD_VALUE, _VALID_VALUE = [
+    status.value for status in [TileStatus.EMPTY, TileStatus.GOOD, TileStatus.PERFECT, TileStatus.BAD, TileStatus.VALID]]
 
 
 class HexGridResultFlag(Flag):
@@ -17,13 +36,125 @@ class HexGridResultFlag(Flag):
     ERROR = auto()
 
 
+class PlacementRejection(Enum):
+    OUT_OF_BOUNDS = auto()
+    NOT_FRONTIER = auto()
+    ILLEGAL_CONNECTION = auto()
+
+
+class PlacementCheck:
+    """The outcome of validating a single tile placement"""
+
+    def __init__(
+        self,
+        reason: Optional[PlacementRejection] = None,
+        edge_index: Optional[EdgeIndex] = None
+    ) -> None:
+        self.reason = reason
+        self.edge_index = edge_index # Edge of the placed tile forming an illegal connection
+
+
+    def __bool__(self) -> bool:
+        return self.reason is None
+
+
+    def __str__(self) -> str:
+        if self.reason is None:
+            return "legal placement"
+        if self.reason == PlacementRejection.OUT_OF_BOUNDS:
+            return "location is outside the board"
+        if self.reason == PlacementRejection.NOT_FRONTIER:
+            return "location is not next to a placed tile or is already occupied"
+        return "illegal connection on edge {}".format(self.edge_index)
+
+
+class Move(NamedTuple):
+    """A placement or removal, as the tiles before and after it at a location relative to the origin tile"""
+    xy: GridCoordinate
+    old_tile: HexTile
+    new_tile: HexTile
+
+
+class AppliedMove(NamedTuple):
+    """The state overwritten by a tentative placement: the edges at its location, and the status and
+    counters of the location and its neighbors (in PATCH_OFFSETS order)"""
+    xy: GridCoordinate
+    edges: np.ndarray
+    statuses: np.ndarray
+    num_good_connections: np.ndarray
+    num_bad_connections: np.ndarray
+    num_empty_neighbors: np.ndarray
+
+
+class HintQuery(NamedTuple):
+    """Which of the ranked placements of a tile to return as a hint (see select_best)"""
+    top_k: Optional[int] = None
+    threshold: Optional[float] = None
+
+
+class OccupiedBounds:
+    """
+    Tracks the extent of the occupied tiles in projected positions (2x+y horizontally, y vertically)
+
+    Locations are relative to the origin tile, so the bounds do not change as the board grows. Each
+    position is counted, so that the bounds can shrink again when the last tile at an extreme is removed.
+    """
+
+    def __init__(self) -> None:
+        self.counts_x = Counter()
+        self.counts_y = Counter()
+        self.bounds = None # (min x, max x, min y, max y), or None if no tile is placed
+
+
+    def add(self, xy: GridCoordinate) -> None:
+        x, y = 2*xy[0] + xy[1], xy[1]
+        self.counts_x[x] += 1
+        self.counts_y[y] += 1
+        if self.bounds is None:
+            self.bounds = (x, x, y, y)
+        else:
+            min_x, max_x, min_y, max_y = self.bounds
+            self.bounds = (min(min_x, x), max(max_x, x), min(min_y, y), max(max_y, y))
+
+
+    def remove(self, xy: GridCoordinate) -> None:
+        x, y = 2*xy[0] + xy[1], xy[1]
+        shrinks = False
+        for counts, value in [(self.counts_x, x), (self.counts_y, y)]:
+            counts[value] -= 1
+            if counts[value] == 0:
+                del counts[value]
+                shrinks = True
+        if not shrinks:
+            return
+        if not self.counts_x:
+            self.bounds = None
+        else:
+            self.bounds = (min(self.counts_x), max(self.counts_x), min(self.counts_y), max(self.counts_y))
+
+
 class HexGrid:
     """
     A class representing a grid of hexagonal tiles
+
+    Tiles are stored as a struct of arrays indexed by location:
+        edges                 -- (size, size, 6) edge codes
+        statuses              -- (size, size) TileStatus values
+        num_good_connections  -- (size, size) counters used to compute the statuses
+        num_bad_connections
+        num_empty_neighbors
+    get_tile returns a HexTileView over these arrays.
     """
 
+    # Statuses whose locations are kept in an index (empty locations are far too numerous)
+    TRACKED_STATUSES = [TileStatus.VALID, TileStatus.GOOD, TileStatus.PERFECT, TileStatus.BAD]
+
+    # Boards grow geometrically (by half their size on each side), but never by less than this
+    MIN_PAD_SIZE = 2
+
     def __init__(self, save_file: Optional[str] = None) -> None:
         """Loads a save file or initializes a new game board"""
+        self.generation = 0 # Incremented on every change to the board
         if save_file is None:
             self._initialize_new_grid()
         else:
@@ -37,25 +168,75 @@ class HexGrid:
         return [(x-1,y), (x,y-1), (x+1,y-1), (x+1,y), (x,y+1), (x-1,y+1)]
 
 
-    def _get_neighbor_tiles(self, xy: GridCoordinate) -> List[HexTile]:
+    def _get_neighbor_tiles(self, xy: GridCoordinate) -> List[HexTileView]:
         """Returns a list of tiles that surround the given loaction"""
         return [self.get_tile(xy_) for xy_ in self._get_neighboring_tile_xys(xy)]
 
 
-    def _get_empty_tiles(self, size: int = 8) -> np.ndarray:
-        """Returns an array of empty tile objects"""
-        return np.array([[HexTile() for _ in range(size)] for _ in range(size)], dtype=object)
+    def _get_neighbor_indices(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns (locations, 6) arrays of neighbor coordinates clipped to the board, and which are on it"""
+        xs_ = xs[:, np.newaxis] + NEIGHBOR_OFFSETS_X
+        ys_ = ys[:, np.newaxis] + NEIGHBOR_OFFSETS_Y
+        in_grid = (xs_ >= 0) & (ys_ >= 0) & (xs_ < self.size) & (ys_ < self.size)
+        return np.clip(xs_, 0, self.size-1), np.clip(ys_, 0, self.size-1), in_grid
+
+
+    def _set_empty_arrays(self, size: int) -> None:
+        """Allocates the arrays of an empty board"""
+        self.generation += 1
+        self.size = size
+        self.edges = np.zeros((size, size, 6), dtype=np.uint8)
+        self.statuses = np.full((size, size), TileStatus.EMPTY.value, dtype=np.uint8)
+        self.num_good_connections = np.zeros((size, size), dtype=np.uint8)
+        self.num_bad_connections = np.zeros((size, size), dtype=np.uint8)
+        self.num_empty_neighbors = np.zeros((size, size), dtype=np.uint8)
+        self.status_locations = {status: set() for status in self.TRACKED_STATUSES}
+        self.occupied_bounds = OccupiedBounds()
+        self.position_hash_value = 0
+        self.hint_cache = HintCache()
+        self.undo_stack = []
+        self.redo_stack = []
+        self.applied_stack = []
+
+
+    def _build_status_index(self) -> None:
+        """Builds the sets of tile locations for every tracked status from the status array"""
+        self.status_locations = {}
+        for status in self.TRACKED_STATUSES:
+            xs, ys = np.nonzero(self.statuses == status.value)
+            self.status_locations[status] = set(zip(xs.tolist(), ys.tolist()))
+
+
+    def _get_tile_locations(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the coordinates of every non-empty tile"""
+        return np.nonzero(self.edges.any(axis=2))
+
+
+    def _build_occupied_bounds(self, xs: Optional[np.ndarray] = None, ys: Optional[np.ndarray] = None) -> None:
+        """Rebuilds the bounds of the occupied tiles, given the locations of every tile if known"""
+        self.occupied_bounds = OccupiedBounds()
+        if xs is None:
+            xs, ys = self._get_tile_locations()
+        x0, y0 = self._get_origin_xy()
+        for xy in zip((xs - x0).tolist(), (ys - y0).tolist()):
+            self.occupied_bounds.add(xy)
+
+
+    def _build_position_hash(self, xs: Optional[np.ndarray] = None, ys: Optional[np.ndarray] = None) -> None:
+        """Recomputes the position hash from the edge array, given the locations of every tile if known"""
+        self.position_hash_value = 0
+        if xs is None:
+            xs, ys = self._get_tile_locations()
+        x0, y0 = self._get_origin_xy()
+        for x, y, codes in zip((xs - x0).tolist(), (ys - y0).tolist(), self.edges[xs, ys].tolist()):
+            self.position_hash_value ^= get_tile_key(x, y, tuple(codes))
 
 
     def _initialize_new_grid(self, size: int = 8) -> None:
         """Creates a game board with only the origin tile"""
-        self.size = size
-        self.tiles = self._get_empty_tiles(size)
+        self._set_empty_arrays(size)
         xy = self._get_origin_xy()
-        origin_tile = self.get_tile(xy)
-        origin_tile.set_edges(HexTile.ORIGIN_EDGES)
-        self.update_tile_status(xy)
-        self.update_neighbors_status(xy)
+        self._write_tile(xy, HexTile(HexTile.ORIGIN_EDGES))
 
 
     def _get_origin_xy(self) -> GridCoordinate:
@@ -63,6 +244,20 @@ class HexGrid:
         return int(self.size/2 - 1), int(self.size/2 - 1)
 
 
+    def _get_relative_xy(self, xy: GridCoordinate) -> GridCoordinate:
+        """Returns the coordinates of a location relative to the origin tile, which do not change as the board grows"""
+        x, y = xy
+        x0, y0 = self._get_origin_xy()
+        return x-x0, y-y0
+
+
+    def _get_absolute_xy(self, xy: GridCoordinate) -> GridCoordinate:
+        """Returns the current coordinates of a location given relative to the origin tile"""
+        x, y = xy
+        x0, y0 = self._get_origin_xy()
+        return x+x0, y+y0
+
+
     def _is_in_grid(self, xy: GridCoordinate) -> bool:
         """Checks if the given coordinates sit within the bounds of the board"""
         x, y = xy
@@ -83,19 +278,31 @@ class HexGrid:
         return x <= threshold or y <= threshold or x >= self.size-1-threshold or y >= self.size-1-threshold
 
 
-    def _enlarge_board(self, pad_size: int = 2) -> None:
-        """Enlarges the game board by padding the existing board with empty tiles"""
-        new_size = self.size + 2*pad_size
-        new_tiles = self._get_empty_tiles(new_size)
-        x0 = y0 = pad_size
-        x1 = y1 = pad_size + self.size
-        new_tiles[x0:x1,y0:y1] = self.tiles
-        self.tiles = new_tiles
-        self.size = new_size
+    def _get_growth_pad_size(self) -> int:
+        """Returns the padding for the next enlargement, which roughly doubles the board size"""
+        return max(self.MIN_PAD_SIZE, self.size // 2)
 
 
-    def _enlarge_and_relocate(self, xy: GridCoordinate, pad_size: int = 2) -> GridCoordinate:
+    def _enlarge_board(self, pad_size: Optional[int] = None) -> None:
+        """Enlarges the game board by padding the existing board with empty tiles"""
+        if pad_size is None:
+            pad_size = self._get_growth_pad_size()
+        self.generation += 1 # Every location moves
+        pad = ((pad_size, pad_size), (pad_size, pad_size))
+        self.edges = np.pad(self.edges, pad + ((0, 0),))
+        self.statuses = np.pad(self.statuses, pad, constant_values=TileStatus.EMPTY.value)
+        self.num_good_connections = np.pad(self.num_good_connections, pad)
+        self.num_bad_connections = np.pad(self.num_bad_connections, pad)
+        self.num_empty_neighbors = np.pad(self.num_empty_neighbors, pad)
+        self.size += 2*pad_size
+        for status, locations in self.status_locations.items():
+            self.status_locations[status] = {(x+pad_size, y+pad_size) for x, y in locations}
+
+
+    def _enlarge_and_relocate(self, xy: GridCoordinate, pad_size: Optional[int] = None) -> GridCoordinate:
         """Enlarges the game board and returns the new location of the given coordinates"""
+        if pad_size is None:
+            pad_size = self._get_growth_pad_size()
         self._enlarge_board(pad_size)
         x, y = xy
         return x+pad_size, y+pad_size
@@ -108,54 +315,240 @@ class HexGrid:
         return xy_, index_
 
 
+    def _get_tile_records(self) -> np.ndarray:
+        """Returns save records of all non-empty tiles"""
+        xs, ys = self._get_tile_locations()
+        x0, y0 = self._get_origin_xy()
+        return make_records(xs - x0, ys - y0, self.edges[xs, ys])
+
+
+    def _set_tile_records(self, size: int, records: np.ndarray) -> None:
+        """Replaces the board with an empty board of a given size holding the tiles of save records"""
+        if size < 2:
+            raise SaveFormatError("Invalid board size {}".format(size))
+        x0, y0 = int(size/2 - 1), int(size/2 - 1) # The origin, checked before the board is replaced
+        xs = records["x"].astype(np.intp) + x0
+        ys = records["y"].astype(np.intp) + y0
+        if np.any((xs < 0) | (ys < 0) | (xs >= size) | (ys >= size)):
+            raise SaveFormatError("Tile records outside of a board of size {}".format(size))
+        if np.any(records["edges"] >= NUM_EDGE_CODES):
+            raise SaveFormatError("Unknown edge codes in tile records")
+        self._set_empty_arrays(size)
+        self.edges[xs, ys] = records["edges"]
+        # Every other location is empty with only empty neighbors, as the new arrays already say
+        xs_ = np.concatenate([xs, (xs[:, np.newaxis] + NEIGHBOR_OFFSETS_X).ravel()])
+        ys_ = np.concatenate([ys, (ys[:, np.newaxis] + NEIGHBOR_OFFSETS_Y).ravel()])
+        in_grid = (xs_ >= 0) & (ys_ >= 0) & (xs_ < size) & (ys_ < size)
+        indices = np.unique(xs_[in_grid]*size + ys_[in_grid])
+        xs, ys = indices // size, indices % size
+        self._update_statuses(xs, ys)
+        is_tile = self.edges[xs, ys].any(axis=1)
+        self._build_occupied_bounds(xs[is_tile], ys[is_tile])
+        self._build_position_hash(xs[is_tile], ys[is_tile])
+
+
     def save(self, file_name: str) -> None:
         """Saves a game board to a save file"""
-        pickle.dump(self.tiles, open(file_name, "wb"))
+        write_board(file_name, self.size, self._get_tile_records())
 
 
     def load(self, file_name: str) -> None:
         """Loads a game board from a save file"""
-        self.tiles = pickle.load(open(file_name, "rb"))
-        self.size = len(self.tiles)
+        if is_board_save_file(file_name):
+            self._set_tile_records(*read_board(file_name))
+            return
+        edges = read_legacy_board(file_name)
+        self._set_empty_arrays(len(edges))
+        self.edges[...] = edges
+        self._update_all_statuses()
 
 
-    def get_tile(self, xy: GridCoordinate) -> HexTile:
+    def to_bytes(self) -> bytes:
+        """Returns the board in the save file format"""
+        return encode_board(self.size, self._get_tile_records())
+
+
+    @staticmethod
+    def from_bytes(data: bytes) -> HexGrid:
+        """Returns a board read from the contents of a save file"""
+        board = HexGrid.__new__(HexGrid)
+        board.generation = 0
+        board._set_tile_records(*decode_board(data))
+        return board
+
+
+    def snapshot(self) -> HexGrid:
+        """Returns a copy of the board sharing no mutable state with it, which can be used from another thread"""
+        board = HexGrid.__new__(HexGrid)
+        board.generation = self.generation
+        board.size = self.size
+        board.edges = self.edges.copy()
+        board.statuses = self.statuses.copy()
+        board.num_good_connections = self.num_good_connections.copy()
+        board.num_bad_connections = self.num_bad_connections.copy()
+        board.num_empty_neighbors = self.num_empty_neighbors.copy()
+        board.status_locations = {status: set(locations) for status, locations in self.status_locations.items()}
+        board.occupied_bounds = copy.deepcopy(self.occupied_bounds)
+        board.position_hash_value = self.position_hash_value
+        board.hint_cache = self.hint_cache.copy()
+        board.undo_stack = []
+        board.redo_stack = []
+        board.applied_stack = []
+        return board
+
+
+    def adopt_hint_cache(self, snapshot: HexGrid) -> None:
+        """Takes over the hint cache of a snapshot, if the board has not changed since it was taken"""
+        if snapshot.generation == self.generation:
+            self.hint_cache = snapshot.hint_cache
+
+
+    def get_tile(self, xy: GridCoordinate) -> HexTileView:
         assert self._is_in_grid(xy)
-        return self.tiles[xy]
+        return HexTileView(self, xy)
 
 
-    def get_connecting_edges(self, xy: GridCoordinate) -> HexTile:
-        """Returns a tile representing all opposite edges given a location"""
-        connections = []
+    def _set_tile_edges(self, xy: GridCoordinate, edges: List[Edge]) -> None:
+        """Writes the edges of a tile into the edge array, without updating any statuses"""
+        self.generation += 1
+        old_codes = self.edges[xy].tolist()
+        self.edges[xy] = [edge.code for edge in edges]
+        self._update_occupied_bounds(xy, not any(old_codes))
+        self._update_position_hash(xy, old_codes)
+        self.hint_cache.invalidate_around(self._get_relative_xy(xy))
+
+
+    def _update_occupied_bounds(self, xy: GridCoordinate, was_empty: bool) -> None:
+        """Updates the occupied bounds after the edges at a location were written"""
+        is_empty = not self.edges[xy].any()
+        if was_empty and not is_empty:
+            self.occupied_bounds.add(self._get_relative_xy(xy))
+        elif is_empty and not was_empty:
+            self.occupied_bounds.remove(self._get_relative_xy(xy))
+
+
+    def _update_position_hash(self, xy: GridCoordinate, old_codes: List[int]) -> None:
+        """Updates the position hash after the edges at a location were overwritten"""
+        x, y = self._get_relative_xy(xy)
+        self.position_hash_value ^= get_tile_key(x, y, tuple(old_codes))
+        self.position_hash_value ^= get_tile_key(x, y, tuple(self.edges[xy].tolist()))
+
+
+    def position_hash(self) -> int:
+        """
+        Returns a 64 bit Zobrist hash of the tiles on the board
+
+        Boards holding the same tiles relative to the origin tile hash the same, whatever their size.
+        """
+        return self.position_hash_value
+
+
+    def get_occupied_bounds(self) -> Optional[Tuple[float, float, float, float]]:
+        """
+        Returns the (left, right, top, bottom) bounds of the occupied tiles in projected positions
+
+        Positions are 2x+y horizontally and 1.5y vertically, in current board coordinates. Returns None
+        if the board holds no tiles.
+        """
+        if self.occupied_bounds.bounds is None:
+            return None
+        min_x, max_x, min_y, max_y = self.occupied_bounds.bounds
+        x0, y0 = self._get_origin_xy()
+        offset = 2*x0 + y0
+        return min_x + offset, max_x + offset, 1.5*(min_y + y0), 1.5*(max_y + y0)
+
+
+    def _get_connecting_codes(self, xy: GridCoordinate) -> List[int]:
+        """Returns the codes of the opposite edges around a location (empty outside the board)"""
+        codes = []
         for index in range(6):
-            xy_, index_ = self._get_opposite_edge_location(xy, index)
-            if self._is_in_grid(xy_) and not self.get_tile(xy_).is_empty():
-                connections.append(self.get_tile(xy_).get_edge(index_))
+            (x_, y_), index_ = self._get_opposite_edge_location(xy, index)
+            if self._is_in_grid((x_, y_)):
+                codes.append(int(self.edges[x_, y_, index_]))
             else:
-                connections.append(Edge.EMPTY)
-        return HexTile(connections)
+                codes.append(Edge.EMPTY.code)
+        return codes
+
+
+    def get_connecting_edges(self, xy: GridCoordinate) -> HexTile:
+        """Returns a tile representing all opposite edges given a location"""
+        return HexTile([Edge.from_code(code) for code in self._get_connecting_codes(xy)])
 
 
     def get_locations_with_status(self, status: TileStatus) -> List[GridCoordinate]:
         """Returns a list of all tile locations with a given status"""
-        result = []
-        for xy in product(range(self.size), range(self.size)):
-            if self.get_tile(xy).get_status() == status:
-                result.append(xy)
-        return result
+        if status in self.status_locations:
+            return sorted(self.status_locations[status])
+        xs, ys = np.nonzero(self.statuses == status.value)
+        return list(zip(xs.tolist(), ys.tolist()))
+
+
+    def get_num_locations_with_status(self, status: TileStatus) -> int:
+        """Returns the number of tile locations with a given status"""
+        if status in self.status_locations:
+            return len(self.status_locations[status])
+        return len(self.get_locations_with_status(status))
+
+
+    def _find_illegal_edge(self, xy: GridCoordinate, tile: HexTile) -> Optional[EdgeIndex]:
+        """Returns the index of the first edge of a tile that would form an illegal connection"""
+        # A neighbor outside the board counts as empty, which connects legally with anything
+        for index, code_ in enumerate(self._get_connecting_codes(xy)):
+            if not is_legal_connection(tile.get_edge(index).code, code_):
+                return index
+        return None
 
 
     def is_legal_placement(self, xy: GridCoordinate, tile: HexTile) -> bool:
         """Checks if the given tile placement is legal"""
-        for index in range(6):
-            edge = tile.get_edge(index)
-            xy_, index_ = self._get_opposite_edge_location(xy, index)
-            if not self._is_in_grid(xy_):
-                continue # Connection with a neighbor outside the board is legal
-            edge_ = self.get_tile(xy_).get_edge(index_)
-            if not Connection(edge, edge_).is_legal():
-                return False
-        return True
+        return self._find_illegal_edge(xy, tile) is None
+
+
+    def validate_placement(self, xy: GridCoordinate, tile: HexTile) -> PlacementCheck:
+        """Checks a single placement using only the target location and its neighbors"""
+        if not self._is_in_grid(xy):
+            return PlacementCheck(PlacementRejection.OUT_OF_BOUNDS)
+        if self.get_tile(xy).get_status() != TileStatus.VALID:
+            return PlacementCheck(PlacementRejection.NOT_FRONTIER)
+        index = self._find_illegal_edge(xy, tile)
+        if index is not None:
+            return PlacementCheck(PlacementRejection.ILLEGAL_CONNECTION, index)
+        return PlacementCheck()
+
+
+    def _get_neighbor_arrays(self, xys: List[GridCoordinate]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Gathers the edge codes and statuses of the neighbors of many locations into arrays"""
+        xs, ys = np.array(xys, dtype=np.intp).reshape(-1, 2).T
+        xs_, ys_, in_grid = self._get_neighbor_indices(xs, ys)
+        # A neighbor outside the board is empty
+        edges = np.where(in_grid, self.edges[xs_, ys_, OPPOSITE_EDGE_INDICES], Edge.EMPTY.code)
+        empty = ~in_grid | ~self.edges[xs_, ys_].any(axis=2)
+        num_good = np.where(in_grid, self.num_good_connections[xs_, ys_], 0)
+        is_good = in_grid & (self.statuses[xs_, ys_] == TileStatus.GOOD.value)
+        return edges, empty, num_good, is_good
+
+
+    def _evaluate_all_placements(self, tile: HexTile) -> BatchPlacementEvaluator:
+        """Scores every rotation of a tile at every frontier location, reusing cached scores where possible"""
+        xys = self.get_locations_with_status(TileStatus.VALID)
+        if self.applied_stack:
+            # Tentative placements are reverted without invalidating the cache, so they must not fill it
+            return BatchPlacementEvaluator(tile, xys, *self._get_neighbor_arrays(xys))
+        relative_xys = [self._get_relative_xy(xy) for xy in xys]
+        metrics = self.hint_cache.lookup(tile, relative_xys)
+        missing = [index for index, metrics_ in enumerate(metrics) if metrics_ is None]
+        if len(missing) == len(xys):
+            batch = BatchPlacementEvaluator(tile, xys, *self._get_neighbor_arrays(xys))
+            self.hint_cache.store(tile, relative_xys, batch.get_metrics())
+            return batch
+        if missing:
+            missing_xys = [xys[index] for index in missing]
+            batch = BatchPlacementEvaluator(tile, missing_xys, *self._get_neighbor_arrays(missing_xys))
+            missing_metrics = batch.get_metrics()
+            self.hint_cache.store(tile, [relative_xys[index] for index in missing], missing_metrics)
+            for index, metrics_ in zip(missing, missing_metrics):
+                metrics[index] = metrics_
+        return BatchPlacementEvaluator.from_metrics(tile, xys, np.array(metrics))
 
 
     def get_legal_placements(self, tile: HexTile) -> List[Tuple[GridCoordinate, HexTile]]:
@@ -170,28 +563,125 @@ class HexGrid:
         return legal_placements
 
 
+    def _update_statuses(self, xs: np.ndarray, ys: np.ndarray) -> None:
+        """Computes the statuses of many locations at once given the edges of their neighbors"""
+        xs_, ys_, in_grid = self._get_neighbor_indices(xs, ys)
+        edges = self.edges[xs, ys]
+        neighbor_edges = np.where(in_grid, self.edges[xs_, ys_, OPPOSITE_EDGE_INDICES], Edge.EMPTY.code)
+        neighbor_empty = ~in_grid | ~self.edges[xs_, ys_].any(axis=2)
+        # Gather statistics
+        good = are_good_connections(edges, neighbor_edges)
+        num_empty_neighbors = neighbor_empty.sum(axis=1)
+        num_bad_connections = (~neighbor_empty & ~good & (neighbor_edges != Edge.EMPTY.code)).sum(axis=1)
+        num_good_connections = 6 - num_empty_neighbors - num_bad_connections
+        # Determine tile status
+        is_empty = ~edges.any(axis=1)
+        statuses = np.select([is_empty & (num_empty_neighbors == 6),
+                              is_empty,
+                              num_good_connections == 6,
+                              num_bad_connections > 0],
+                             [TileStatus.EMPTY.value,
+                              TileStatus.VALID.value,
+                              TileStatus.PERFECT.value,
+                              TileStatus.BAD.value],
+                             default=TileStatus.GOOD.value)
+        old_statuses = self.statuses[xs, ys]
+        self.statuses[xs, ys] = statuses
+        self.num_good_connections[xs, ys] = num_good_connections
+        self.num_bad_connections[xs, ys] = num_bad_connections
+        self.num_empty_neighbors[xs, ys] = num_empty_neighbors
+        # Keep the status index up to date
+        changed = np.nonzero(old_statuses != statuses)[0]
+        for x, y, old_status, new_status in zip(xs[changed].tolist(), ys[changed].tolist(),
+                                                old_statuses[changed].tolist(), statuses[changed].tolist()):
+            self._move_status_location((x, y), old_status, new_status)
+
+
+    def _update_patch_statuses(self, xy: GridCoordinate) -> None:
+        """
+        Updates the statuses of a location and its neighbors, like _update_statuses
+
+        Computed with plain Python over a copy of the 5x5 block around the location, which is much faster
+        than array operations for so few locations. The location must be at least 2 cells from the border.
+        """
+        x, y = xy
+        block = self.edges[x-2:x+3, y-2:y+3].tolist()
+        occupied = [[any(edges) for edges in column] for column in block]
+        empty_code = Edge.EMPTY.code
+        statuses = []
+        counters = []
+        for dx, dy in _PATCH_OFFSETS:
+            x_, y_ = 2+dx, 2+dy
+            edges = block[x_][y_]
+            num_empty_neighbors = num_bad_connections = 0
+            for index, (dx_, dy_) in enumerate(_NEIGHBOR_OFFSETS):
+                if not occupied[x_+dx_][y_+dy_]:
+                    num_empty_neighbors += 1
+                    continue
+                code_ = block[x_+dx_][y_+dy_][(index+3)%6]
+                if code_ != empty_code and not is_good_connection(edges[index], code_):
+                    num_bad_connections += 1
+            num_good_connections = 6 - num_empty_neighbors - num_bad_connections
+            if not occupied[x_][y_]:
+                status = _EMPTY_VALUE if num_empty_neighbors == 6 else _VALID_VALUE
+            elif num_good_connections == 6:
+                status = _PERFECT_VALUE
+            elif num_bad_connections > 0:
+                status = _BAD_VALUE
+            else:
+                status = _GOOD_VALUE
+            statuses.append(status)
+            counters.append((num_good_connections, num_bad_connections, num_empty_neighbors))
+        xs = x + PATCH_OFFSETS_X
+        ys = y + PATCH_OFFSETS_Y
+        for (x_, y_), old_status, new_status in zip(zip(xs.tolist(), ys.tolist()), self.statuses[xs, ys].tolist(), statuses):
+            if old_status != new_status:
+                self._move_status_location((x_, y_), old_status, new_status)
+        self.statuses[xs, ys] = statuses
+        self.num_good_connections[xs, ys], self.num_bad_connections[xs, ys], self.num_empty_neighbors[xs, ys] = zip(*counters)
+
+
+    def _move_status_location(self, xy: GridCoordinate, old_value: int, new_value: int) -> None:
+        """Moves a location between the status index sets after its status value changed"""
+        old_status = TILE_STATUSES_BY_VALUE[old_value]
+        new_status = TILE_STATUSES_BY_VALUE[new_value]
+        if old_status in self.status_locations:
+            self.status_locations[old_status].discard(xy)
+        if new_status in self.status_locations:
+            self.status_locations[new_status].add(xy)
+
+
+    def _update_all_statuses(self) -> None:
+        """Recomputes the status of every location on the board in bulk"""
+        xs, ys = np.indices((self.size, self.size)).reshape(2, -1)
+        self._update_statuses(xs, ys)
+        self._build_status_index()
+        self._build_occupied_bounds()
+        self._build_position_hash()
+
+
     def update_tile_status(self, xy: GridCoordinate) -> None:
         """Updates the status of a tile"""
-        neighborTiles = self._get_neighbor_tiles(xy)
-        self.get_tile(xy).update_status(neighborTiles)
+        x, y = xy
+        self._update_statuses(np.array([x]), np.array([y]))
 
 
     def update_neighbors_status(self, xy: GridCoordinate) -> None:
         """Updates the status of all neighbors to a tile"""
-        for xy_ in self._get_neighboring_tile_xys(xy):
-            self.update_tile_status(xy_)
+        x, y = xy
+        self._update_statuses(x + NEIGHBOR_OFFSETS_X, y + NEIGHBOR_OFFSETS_Y)
 
 
     def place_tile(self, xy: GridCoordinate, tile: HexTile) -> HexGridResultFlag:
         """Attempts to place a tile at a given location and updates the status of neighbors"""
-        if not self._is_in_grid(xy) or (xy, tile) not in self.get_legal_placements(tile):
-            print("Illegal placement: {}: ".format(xy), tile)
+        check = self.validate_placement(xy, tile)
+        if not check:
+            print("Illegal placement: {}: {}".format(xy, check))
             return HexGridResultFlag.ERROR
         if self._is_near_border(xy, threshold=1):
             xy = self._enlarge_and_relocate(xy)
-        self.get_tile(xy).set_edges(tile.edges)
-        self.update_tile_status(xy)
-        self.update_neighbors_status(xy)
+        self._record_move(xy, tile)
+        self._write_tile(xy, tile)
         return HexGridResultFlag.OK
 
 
@@ -200,36 +690,148 @@ class HexGrid:
         if not self._is_in_grid(xy) or self.get_tile(xy).is_empty():
             print("Illegal removal: {}: ".format(xy))
             return HexGridResultFlag.ERROR
-        self.get_tile(xy).clear_edges()
+        self._record_move(xy, HexTile())
+        self._write_tile(xy, HexTile())
+        return HexGridResultFlag.OK
+
+
+    def _write_tile(self, xy: GridCoordinate, tile: HexTile) -> None:
+        """Writes a tile to a location and updates the status of it and its neighbors"""
+        self._set_tile_edges(xy, tile.get_edges())
         self.update_tile_status(xy)
         self.update_neighbors_status(xy)
+
+
+    def _record_move(self, xy: GridCoordinate, tile: HexTile) -> None:
+        """Records that a tile is about to be written to a location, which discards any undone moves"""
+        self.undo_stack.append(Move(self._get_relative_xy(xy), self.get_tile(xy).to_tile(), tile))
+        self.redo_stack.clear()
+
+
+    def can_undo(self) -> bool:
+        return len(self.undo_stack) > 0
+
+
+    def can_redo(self) -> bool:
+        return len(self.redo_stack) > 0
+
+
+    def undo(self) -> HexGridResultFlag:
+        """Reverts the last placement or removal"""
+        if not self.undo_stack:
+            return HexGridResultFlag.ERROR
+        move = self.undo_stack.pop()
+        self._write_tile(self._get_absolute_xy(move.xy), move.old_tile)
+        self.redo_stack.append(move)
         return HexGridResultFlag.OK
 
 
-    def rank_all_placements(self, tile:HexTile) -> List[PlacementEvaluator]:
+    def redo(self) -> HexGridResultFlag:
+        """Repeats the last undone placement or removal"""
+        if not self.redo_stack:
+            return HexGridResultFlag.ERROR
+        move = self.redo_stack.pop()
+        self._write_tile(self._get_absolute_xy(move.xy), move.new_tile)
+        self.undo_stack.append(move)
+        return HexGridResultFlag.OK
+
+
+    def ensure_margin(self, margin: int) -> None:
+        """
+        Enlarges the board so that every tile and frontier location is at least margin cells from its border
+
+        With a margin of n, n-1 tentative placements in a row can be applied without reaching the border.
+        Must not be called while tentative placements are applied, as enlarging moves every location.
+        """
+        assert not self.applied_stack
+        xs, ys = np.nonzero(self.statuses != TileStatus.EMPTY.value)
+        if len(xs) == 0:
+            return
+        shortfall = margin - min(xs.min(), ys.min(), self.size-1 - xs.max(), self.size-1 - ys.max())
+        if shortfall > 0:
+            self._enlarge_board(max(int(shortfall), self._get_growth_pad_size()))
+
+
+    def get_search_copy(self, margin: int) -> HexGrid:
+        """Returns a snapshot of the board with the given margin (see ensure_margin), leaving the board unchanged"""
+        board = self.snapshot()
+        board.ensure_margin(margin)
+        return board
+
+
+    def get_corresponding_xy(self, board: HexGrid, xy: GridCoordinate) -> GridCoordinate:
+        """Returns the location on this board of a location on a copy of it, which may differ in size"""
+        return self._get_absolute_xy(board._get_relative_xy(xy))
+
+
+    def apply(self, xy: GridCoordinate, tile: HexTile) -> None:
+        """
+        Places a tile tentatively, to be undone by revert
+
+        Only the location and its neighbors are updated and the board is never reallocated, so the
+        location must be at least 2 cells from the border (see ensure_margin). The placement is not
+        validated, and tentative placements are not recorded in the undo history.
+        """
+        assert not self._is_near_border(xy, threshold=1)
+        xs = xy[0] + PATCH_OFFSETS_X
+        ys = xy[1] + PATCH_OFFSETS_Y
+        self.applied_stack.append(AppliedMove(xy,
+                                              self.edges[xy].copy(),
+                                              self.statuses[xs, ys],
+                                              self.num_good_connections[xs, ys],
+                                              self.num_bad_connections[xs, ys],
+                                              self.num_empty_neighbors[xs, ys]))
+        old_codes = self.edges[xy].tolist()
+        self.edges[xy] = [edge.code for edge in tile.edges]
+        self._update_occupied_bounds(xy, not any(old_codes))
+        self._update_position_hash(xy, old_codes)
+        self._update_patch_statuses(xy)
+        self.generation += 1
+
+
+    def revert(self) -> None:
+        """Undoes the last tentative placement, restoring the board exactly as it was"""
+        move = self.applied_stack.pop()
+        x, y = move.xy
+        xs = x + PATCH_OFFSETS_X
+        ys = y + PATCH_OFFSETS_Y
+        old_codes = self.edges[move.xy].tolist()
+        self.edges[move.xy] = move.edges
+        self._update_occupied_bounds(move.xy, not any(old_codes))
+        self._update_position_hash(move.xy, old_codes)
+        for xy_, old_status, new_status in zip(zip(xs.tolist(), ys.tolist()), self.statuses[xs, ys].tolist(),
+                                               move.statuses.tolist()):
+            if old_status != new_status:
+                self._move_status_location(xy_, old_status, new_status)
+        self.statuses[xs, ys] = move.statuses
+        self.num_good_connections[xs, ys] = move.num_good_connections
+        self.num_bad_connections[xs, ys] = move.num_bad_connections
+        self.num_empty_neighbors[xs, ys] = move.num_empty_neighbors
+        self.generation += 1
+
+
+    def evaluate_placement(self, xy: GridCoordinate, tile: HexTile) -> PlacementEvaluation:
+        """Evaluates a single placement of a tile"""
+        return PlacementEvaluator(tile, xy, self._get_neighbor_tiles(xy)).evaluate()
+
+
+    def rank_all_placements(self, tile:HexTile) -> List[PlacementEvaluation]:
         """Ranks every legal placement of a tile based on the evaluations of those placements"""
-        placements = self.get_legal_placements(tile)
-        evaluators = []
-        for placement in placements:
-            xy, tile_ = placement
-            neighborTiles = self._get_neighbor_tiles(xy)
-            evaluator = PlacementEvaluator(tile_, xy, neighborTiles)
-            evaluators.append(evaluator)
-        ranked_evaluators = sorted(evaluators, key=lambda x: x.get_score(), reverse=True)
-        return ranked_evaluators
+        batch = self._evaluate_all_placements(tile)
+        return [batch.get_evaluation(*placement) for placement in batch.get_ranking()]
 
 
     # TODO: clean up API
-    def get_hint(self, tile:HexTile, top_k=None, threshold=None) -> list:
+    def get_hint(self, tile:HexTile, top_k=None, threshold=None) -> List[PlacementEvaluation]:
         """Returns the evaluations of the best placements of a tile"""
-        ranked_evaluators = self.rank_all_placements(tile)
-        num_evals = len(ranked_evaluators)
-        if not threshold is None:
-            above_threshold = [evaluator.get_score() >= threshold for evaluator in ranked_evaluators]
-            num_evals = above_threshold.index(False)
-        if not top_k is None:
-            num_evals = min(top_k, num_evals)
-        return ranked_evaluators[0:num_evals]
+        batch = self._evaluate_all_placements(tile)
+        return [batch.get_evaluation(*placement) for placement in batch.get_ranking(top_k, threshold)]
+
+
+    def get_hints(self, tile: HexTile, queries: List[HintQuery]) -> List[List[PlacementEvaluation]]:
+        """Returns the hints of several queries, from a single scoring pass"""
+        batch = self._evaluate_all_placements(tile)
+        return [[batch.get_evaluation(*placement) for placement in batch.get_ranking(*query)] for query in queries]
 
 
     
\ No newline at end of file
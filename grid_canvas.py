@@ -1,28 +1,64 @@
 import numpy as np
-from itertools import product
-from math import sin, cos, pi, dist
+from enum import Enum
+from math import sin, cos, pi, dist, floor, ceil
 from typing import Optional, List, Tuple
 
 from tkinter import Canvas
 
 from tile import HexTile, TileStatus
-from evaluator import PlacementEvaluator
+from evaluator import PlacementEvaluation
 from grid import HexGrid
-from utils import Color, EdgeIndex, GridCoordinate, PixelCoordinate, is_point_inside_polygon
+from render_scheduler import RenderScheduler
+from utils import Color, EdgeIndex, GridCoordinate, PixelCoordinate, round_axial
+
+
+class CellStyle(Enum):
+    TILE = 1    # Hexagon filled with the tile status color, with a border
+    EDGES = 2   # One triangle per edge filled with the edge color, with a border
+    SIMPLE = 3  # Hexagon filled with the tile status color, without a border (for small tiles)
 
 
 """
 Canvas that displays the full game board
 """
 class HexGridCanvas(Canvas):
-    def __init__(self, master, width: int = 1300, height: int = 1000, *args, **kwargs) -> None:
+    MIN_DETAIL_RADIUS = 8 # Tile radius in pixels below which tiles are drawn with the SIMPLE style
+    MIN_ZOOM_RADIUS = 2
+    MAX_ZOOM_RADIUS = 200
+    ZOOM_FACTOR = 1.2
+
+    def __init__(
+        self,
+        master,
+        width: int = 1300,
+        height: int = 1000,
+        scheduler: Optional[RenderScheduler] = None,
+        *args,
+        **kwargs
+    ) -> None:
         super().__init__(master, background='white', width=width, height=height, *args, **kwargs)
         self.width  = width
         self.height = height
+        self.scheduler = scheduler
         self.hint_hexes = []
         self.selected_hex = None
         self.view_edges = False
         self.hex_ratio = abs(cos(self._get_vertex_angle(0))) # Ratio of a hexagon's height to its width
+        # Retained canvas items and the state they were last drawn with
+        self.cell_items = {}        # location -> canvas item ids of the cell
+        self.cell_appearances = {}  # location -> appearance the items were drawn with
+        self.selection_items = []
+        self.drawn_layout = None    # (board size, cell style) that the cell items belong to
+        self.drawn_transform = None # (tile radius, pixel offset) of the cell item coordinates
+        self.drawn_statuses = None  # Statuses of the drawn cells, EMPTY where nothing is drawn
+        self.drawn_edges = None
+        self.drawn_hint_hexes = set()
+        self.drawn_selected_hex = None
+        # Viewport, or None to fit the whole board on the canvas. The center is a tile position
+        # relative to the origin tile, so that it stays in place when the board is enlarged.
+        self.viewport_radius = None
+        self.viewport_center = None
+        self.pan_start_pixel = None
 
 
     def _get_vertex_angle(self, index: EdgeIndex) -> float:
@@ -32,23 +68,26 @@ class HexGridCanvas(Canvas):
 
     def _get_tile_position_bounds(self, board: HexGrid, margin: float = 0) -> Tuple[float, float, float, float]:
         """Computes the bounds of tile positions spacially"""
-        left = top = float("inf")
-        right = bottom = -float("inf")
-        for xy in product(range(board.size), range(board.size)):
-            if not board.get_tile(xy).is_empty():
-                x, y = xy
-                pos_x = 2*x + y
-                pos_y = 1.5*y
-                left = min(left, pos_x-margin)
-                right = max(right, pos_x+margin)
-                top = min(top, pos_y-margin)
-                bottom = max(bottom, pos_y+margin)
-        return left, right, top, bottom
+        bounds = board.get_occupied_bounds()
+        if bounds is None:
+            x, y = board._get_origin_xy()
+            bounds = (2*x + y, 2*x + y, 1.5*y, 1.5*y)
+        left, right, top, bottom = bounds
+        return left-margin, right+margin, top-margin, bottom+margin
 
 
     def _set_coordinate_transform_parameters(self, board: HexGrid) -> None:
         """Computes pixel offsets and scaling parameters needed to center the hex grid on the canvas"""
         self.size = board.size
+        origin_x, origin_y = board._get_origin_xy()
+        self.origin_position = (2*origin_x + origin_y, 1.5*origin_y)
+        if self.viewport_radius is not None:
+            self.tile_radius = self.viewport_radius
+            center_x = self.origin_position[0] + self.viewport_center[0]
+            center_y = self.origin_position[1] + self.viewport_center[1]
+            self.pixel_offset_xy = (self.tile_radius * self.hex_ratio * center_x - self.width/2,
+                                    self.tile_radius * center_y - self.height/2)
+            return
         left, right, top, bottom = self._get_tile_position_bounds(board, margin=4)
         board_width = right - left
         board_height = bottom - top
@@ -71,6 +110,34 @@ class HexGridCanvas(Canvas):
         return pixel_x, pixel_y
 
 
+    def _get_position_from_pixel(self, pixel_xy: PixelCoordinate) -> Tuple[float, float]:
+        """Returns the tile position (2x+y, 1.5y) shown at a pixel coordinate"""
+        pixel_offset_x, pixel_offset_y = self.pixel_offset_xy
+        return ((pixel_xy[0] + pixel_offset_x) / (self.tile_radius * self.hex_ratio),
+                (pixel_xy[1] + pixel_offset_y) / self.tile_radius)
+
+
+    def _get_visible_window(self) -> Tuple[int, int, int, int]:
+        """Returns the (x start, x stop, y start, y stop) range of board cells that can intersect the canvas"""
+        left, top = self._get_position_from_pixel((0, 0))
+        right, bottom = self._get_position_from_pixel((self.width, self.height))
+        # Pad by one cell since the positions are tile centers
+        y_start = floor(top / 1.5) - 1
+        y_stop = ceil(bottom / 1.5) + 2
+        x_start = floor((left - y_stop) / 2) - 1
+        x_stop = ceil((right - y_start) / 2) + 2
+        return (max(x_start, 0), min(max(x_stop, 0), self.size),
+                max(y_start, 0), min(max(y_stop, 0), self.size))
+
+
+    def _get_cell_style(self) -> CellStyle:
+        if self.tile_radius < self.MIN_DETAIL_RADIUS:
+            return CellStyle.SIMPLE
+        if self.view_edges:
+            return CellStyle.EDGES
+        return CellStyle.TILE
+
+
     def _get_tile_vertices(self, xy: GridCoordinate) -> List[PixelCoordinate]:
         """Returns the vertices of a tile"""
         pixel_x, pixel_y = self._get_tile_center_pixel(xy)
@@ -85,13 +152,15 @@ class HexGridCanvas(Canvas):
         fill_color: Optional[str] = None,
         border_color: Optional[str] = None,
         border_width: float = 2
-    ) -> None:
-        """Draws a tile on the canvas at a given position"""
+    ) -> List[int]:
+        """Draws a tile on the canvas at a given position and returns the ids of the created items"""
         vertices = self._get_tile_vertices(xy)
+        items = []
         if not fill_color is None:
-            self.create_polygon(vertices, fill=fill_color)
+            items.append(self.create_polygon(vertices, fill=fill_color))
         if not border_color is None:
-                self.create_line(vertices, vertices[0], fill=border_color, width=border_width)
+            items.append(self.create_line(vertices, vertices[0], fill=border_color, width=border_width))
+        return items
     
 
     def draw_edges(
@@ -100,49 +169,229 @@ class HexGridCanvas(Canvas):
         fill_colors: Optional[List[str]] = None,
         border_color: Optional[str] = None,
         border_width: float = 2
-    ) -> None:
-        """Draws a tile on the canvas at a given position"""
+    ) -> List[int]:
+        """Draws the edges of a tile on the canvas at a given position and returns the ids of the created items"""
         center = self._get_tile_center_pixel(xy)
         vertices = self._get_tile_vertices(xy)
+        items = []
         if not fill_colors is None:
             for i in range(6):
-                self.create_polygon([center, vertices[i], vertices[(i+1)%6]], fill=fill_colors[i])
+                items.append(self.create_polygon([center, vertices[i], vertices[(i+1)%6]], fill=fill_colors[i]))
         if not border_color is None:
-                self.create_line(vertices, vertices[0], fill=border_color, width=border_width)
+            items.append(self.create_line(vertices, vertices[0], fill=border_color, width=border_width))
+        return items
+
+
+    def _get_cell_item_coords(self, xy: GridCoordinate) -> List[List[PixelCoordinate]]:
+        """Returns the coordinates of every item of a drawn cell, in the order the items were created"""
+        vertices = self._get_tile_vertices(xy)
+        border = vertices + vertices[:1]
+        if self.cell_style == CellStyle.SIMPLE:
+            return [vertices]
+        if self.cell_style == CellStyle.EDGES:
+            center = self._get_tile_center_pixel(xy)
+            return [[center, vertices[i], vertices[(i+1)%6]] for i in range(6)] + [border]
+        return [vertices, border]
+
+
+    def _get_cell_appearance(self, board: HexGrid, xy: GridCoordinate) -> Optional[Tuple[str, ...]]:
+        """Returns the fill colors a cell should be drawn with, or None if it should not be drawn"""
+        tile = board.get_tile(xy)
+        status = tile.get_status()
+        if status == TileStatus.EMPTY:
+            return None
+        if self.cell_style == CellStyle.EDGES:
+            return tuple(edge.to_color() for edge in tile.get_edges())
+        if status == TileStatus.VALID and xy in self.hint_hexes:
+            return (Color.PLUM,)
+        return (status.to_color(),)
+
+
+    def _draw_cell(self, board: HexGrid, xy: GridCoordinate) -> None:
+        """Creates, updates or deletes the canvas items of a single cell"""
+        appearance = self._get_cell_appearance(board, xy)
+        if appearance == self.cell_appearances.get(xy):
+            return
+        items = self.cell_items.get(xy)
+        if appearance is None:
+            self.delete(*items)
+            del self.cell_items[xy]
+            del self.cell_appearances[xy]
+            return
+        if items is None:
+            if self.cell_style == CellStyle.SIMPLE:
+                items = self.draw_tile(xy, fill_color=appearance[0], border_color=None)
+            elif self.cell_style == CellStyle.EDGES:
+                items = self.draw_edges(xy, fill_colors=appearance, border_color=Color.BLACK)
+            else:
+                items = self.draw_tile(xy, fill_color=appearance[0], border_color=Color.BLACK)
+            self.cell_items[xy] = items
+        else:
+            for item, fill_color in zip(items, appearance):
+                self.itemconfig(item, fill=fill_color)
+        self.cell_appearances[xy] = appearance
+
+
+    def _clear(self) -> None:
+        """Deletes all items from the canvas"""
+        self.delete('all')
+        self.cell_items = {}
+        self.cell_appearances = {}
+        self.selection_items = []
+        self.drawn_statuses = np.full((self.size, self.size), TileStatus.EMPTY.value, dtype=np.uint8)
+        self.drawn_edges = np.zeros((self.size, self.size, 6), dtype=np.uint8)
+        self.drawn_selected_hex = None
+
+
+    def _cull_cells(self, window: Tuple[int, int, int, int]) -> None:
+        """Deletes the items of all cells outside a window of the board"""
+        x_start, x_stop, y_start, y_stop = window
+        for xy in list(self.cell_items):
+            x, y = xy
+            if not (x_start <= x < x_stop and y_start <= y < y_stop):
+                self.delete(*self.cell_items.pop(xy))
+                del self.cell_appearances[xy]
+                self.drawn_statuses[xy] = TileStatus.EMPTY.value
+
+
+    def _get_changed_cells(self, board: HexGrid, window: Tuple[int, int, int, int]) -> List[GridCoordinate]:
+        """Returns the cells of a window whose status, edges or hint highlight changed since they were last drawn"""
+        x_start, x_stop, y_start, y_stop = window
+        region = (slice(x_start, x_stop), slice(y_start, y_stop))
+        changed = board.statuses[region] != self.drawn_statuses[region]
+        if self.cell_style == CellStyle.EDGES:
+            changed |= (board.edges[region] != self.drawn_edges[region]).any(axis=2)
+        xs, ys = np.nonzero(changed)
+        cells = set(zip((xs + x_start).tolist(), (ys + y_start).tolist()))
+        for x, y in self.drawn_hint_hexes.symmetric_difference(self.hint_hexes):
+            if x_start <= x < x_stop and y_start <= y < y_stop:
+                cells.add((x, y))
+        return sorted(cells)
+
+
+    def _move_items(self) -> None:
+        """Moves all drawn items to match the current coordinate transform"""
+        for xy, items in self.cell_items.items():
+            for item, coords in zip(items, self._get_cell_item_coords(xy)):
+                self.coords(item, *[value for vertex in coords for value in vertex])
 
 
     def draw(self, board: HexGrid) -> None:
-        """Draws the full game board on the canvas"""
+        """
+        Draws the full game board on the canvas
+
+        Canvas items are kept between draws. Only cells whose appearance changed are updated, and
+        items are only moved when the coordinate transform changes. When zoomed in, only the cells in
+        view are drawn, found by slicing the board arrays to the visible range of cells.
+        """
         self._set_coordinate_transform_parameters(board)
-        self.delete('all')
-        for xy in product(range(board.size), range(board.size)):
-            status = board.get_tile(xy).get_status()
-            if status == TileStatus.EMPTY:
-                # self.draw_tile(x, y, fill_color=None, border_color='purple')
-                continue
-            if self.view_edges:
-                fill_colors = [edge.to_color() for edge in board.get_tile(xy).get_edges()]
-                self.draw_edges(xy, fill_colors=fill_colors, border_color=Color.BLACK)
-            else:
-                if status == TileStatus.VALID and xy in self.hint_hexes:
-                    fill_color = Color.PLUM
-                else:
-                    fill_color = status.to_color()
-                self.draw_tile(xy, fill_color=fill_color, border_color=Color.BLACK)
-        if self.selected_hex is not None:
-            self.draw_tile(self.selected_hex, border_color=Color.YELLOW)
+        self.cell_style = self._get_cell_style()
+        layout = (board.size, self.cell_style)
+        transform = (self.tile_radius, self.pixel_offset_xy)
+        if layout != self.drawn_layout:
+            self._clear() # Cell locations shift when the board grows
+        elif transform != self.drawn_transform:
+            self._move_items()
+        if self.viewport_radius is None:
+            window = (0, board.size, 0, board.size)
+        else:
+            window = self._get_visible_window()
+            self._cull_cells(window)
+        for xy in self._get_changed_cells(board, window):
+            self._draw_cell(board, xy)
+        if self.selected_hex != self.drawn_selected_hex or transform != self.drawn_transform:
+            self.delete(*self.selection_items)
+            self.selection_items = []
+            if self.selected_hex is not None:
+                self.selection_items = self.draw_tile(self.selected_hex, border_color=Color.YELLOW)
+        for item in self.selection_items:
+            self.tag_raise(item)
+        self.drawn_layout = layout
+        self.drawn_transform = transform
+        x_start, x_stop, y_start, y_stop = window
+        self.drawn_statuses[x_start:x_stop, y_start:y_stop] = board.statuses[x_start:x_stop, y_start:y_stop]
+        self.drawn_edges[x_start:x_stop, y_start:y_stop] = board.edges[x_start:x_stop, y_start:y_stop]
+        self.drawn_hint_hexes = set(self.hint_hexes)
+        self.drawn_selected_hex = self.selected_hex
     
 
+    def request_draw(self, board: HexGrid) -> None:
+        """Draws the board, or schedules the draw if the canvas has a render scheduler"""
+        if self.scheduler is None:
+            self.draw(board)
+        else:
+            self.scheduler.request(self, lambda: self.draw(board))
+
+
     def toggle_view(self) -> None:
         self.view_edges = not self.view_edges
 
 
-    def get_xy_from_pix(self, pixel_xy: PixelCoordinate) -> None:
+    def _start_viewport(self) -> None:
+        """Switches from fitting the board to a viewport showing what is currently displayed"""
+        if self.viewport_radius is not None:
+            return
+        center_x, center_y = self._get_position_from_pixel((self.width/2, self.height/2))
+        self.viewport_radius = self.tile_radius
+        self.viewport_center = (center_x - self.origin_position[0], center_y - self.origin_position[1])
+
+
+    def zoom(self, pixel_xy: PixelCoordinate, factor: float) -> None:
+        """Scales the tiles by a factor, keeping the point under a pixel coordinate in place"""
+        self._start_viewport()
+        position_x, position_y = self._get_position_from_pixel(pixel_xy)
+        radius = min(max(self.viewport_radius * factor, self.MIN_ZOOM_RADIUS), self.MAX_ZOOM_RADIUS)
+        center_x = position_x - (pixel_xy[0] - self.width/2) / (radius * self.hex_ratio)
+        center_y = position_y - (pixel_xy[1] - self.height/2) / radius
+        self.viewport_radius = radius
+        self.viewport_center = (center_x - self.origin_position[0], center_y - self.origin_position[1])
+        self.tile_radius = radius
+        self.pixel_offset_xy = (radius * self.hex_ratio * center_x - self.width/2, radius * center_y - self.height/2)
+
+
+    def pan(self, pixel_dx: float, pixel_dy: float) -> None:
+        """Moves the board by a number of pixels"""
+        self._start_viewport()
+        center_x, center_y = self.viewport_center
+        self.viewport_center = (center_x - pixel_dx / (self.viewport_radius * self.hex_ratio),
+                                center_y - pixel_dy / self.viewport_radius)
+        pixel_offset_x, pixel_offset_y = self.pixel_offset_xy
+        self.pixel_offset_xy = (pixel_offset_x - pixel_dx, pixel_offset_y - pixel_dy)
+
+
+    def fit_view(self) -> None:
+        """Goes back to fitting the whole board on the canvas"""
+        self.viewport_radius = None
+        self.viewport_center = None
+
+
+    def on_mouse_wheel(self, event) -> None:
+        # <MouseWheel> events carry a delta, X11 sends scrolling as buttons 4 (up) and 5 (down)
+        zoom_in = event.delta > 0 if event.num not in (4, 5) else event.num == 4
+        self.zoom((event.x, event.y), self.ZOOM_FACTOR if zoom_in else 1/self.ZOOM_FACTOR)
+
+
+    def on_pan_start(self, event) -> None:
+        self.pan_start_pixel = (event.x, event.y)
+
+
+    def on_pan_drag(self, event) -> None:
+        if self.pan_start_pixel is None:
+            self.pan_start_pixel = (event.x, event.y)
+        self.pan(event.x - self.pan_start_pixel[0], event.y - self.pan_start_pixel[1])
+        self.pan_start_pixel = (event.x, event.y)
+
+
+    def get_xy_from_pix(self, pixel_xy: PixelCoordinate) -> Optional[GridCoordinate]:
         """Returns the grid coordinates of the hex belonging to the given pixel coordinates"""
-        for xy in product(range(self.size), range(self.size)):
-            vertices = self._get_tile_vertices(xy)
-            if is_point_inside_polygon(pixel_xy, vertices):
-                return xy
+        # Inverse of _get_tile_center_pixel
+        pixel_offset_x, pixel_offset_y = self.pixel_offset_xy
+        pixel_x, pixel_y = pixel_xy
+        y = (pixel_y + pixel_offset_y) / (1.5 * self.tile_radius)
+        x = ((pixel_x + pixel_offset_x) / (self.tile_radius * self.hex_ratio) - y) / 2
+        x, y = round_axial(x, y)
+        if 0 <= x < self.size and 0 <= y < self.size:
+            return x, y
         return None
 
 
@@ -150,10 +399,10 @@ class HexGridCanvas(Canvas):
         self.selected_hex = xy
 
 
-    def set_hint(self, hint: List[PlacementEvaluator]):
+    def set_hint(self, hint: List[PlacementEvaluation]):
         """Set which tiles to highlight given a hint"""
         self.hint_hexes = []
         if hint is None:
             return
-        for evaluator in hint:
-            self.hint_hexes.append(evaluator.xy)
\ No newline at end of file
+        for evaluation in hint:
+            self.hint_hexes.append(evaluation.xy)
\ No newline at end of file
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+import numpy as np
+from typing import Dict, List, Optional
+
+from tile import HexTile
+from utils import GridCoordinate
+
+
+# Offsets of all locations within distance 2 of a location. The evaluation of a placement depends on
+# the edges of its neighbors and on their statuses, which in turn depend on their own neighbors.
+DIRTY_OFFSETS = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3) if abs(dx + dy) <= 2]
+
+
+class HintCache:
+    """
+    Caches the evaluations of every rotation of a tile type at a location
+
+    Entries are keyed by the canonical tile code and by the location relative to the origin tile, so they
+    survive the board being enlarged. A change to the board invalidates every entry within distance 2.
+    """
+
+    def __init__(self, max_tile_types: int = 32) -> None:
+        self.max_tile_types = max_tile_types
+        self.entries = OrderedDict() # canonical code -> {relative location -> (5, rotations) metrics}
+        self.num_hits = 0
+        self.num_misses = 0
+
+
+    def _get_entries(self, tile: HexTile) -> Dict[GridCoordinate, np.ndarray]:
+        """Returns the entries of a tile type, evicting the least recently used tile type if needed"""
+        entries = self.entries.get(tile.canonical_code)
+        if entries is None:
+            entries = self.entries[tile.canonical_code] = {}
+            if len(self.entries) > self.max_tile_types:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(tile.canonical_code)
+        return entries
+
+
+    def lookup(self, tile: HexTile, xys: List[GridCoordinate]) -> List[Optional[np.ndarray]]:
+        """Returns the cached metrics of a tile type at each (relative) location, or None if missing"""
+        entries = self._get_entries(tile)
+        result = [entries.get(xy) for xy in xys]
+        num_misses = sum(metrics is None for metrics in result)
+        self.num_misses += num_misses
+        self.num_hits += len(result) - num_misses
+        return result
+
+
+    def store(self, tile: HexTile, xys: List[GridCoordinate], metrics: np.ndarray) -> None:
+        """Stores (locations, 5, rotations) metrics of a tile type at (relative) locations"""
+        entries = self._get_entries(tile)
+        for xy, metrics_ in zip(xys, metrics):
+            entries[xy] = metrics_
+
+
+    def invalidate_around(self, xy: GridCoordinate) -> None:
+        """Drops all entries within distance 2 of a (relative) location that changed"""
+        x, y = xy
+        dirty = [(x+dx, y+dy) for dx, dy in DIRTY_OFFSETS]
+        for entries in self.entries.values():
+            for xy_ in dirty:
+                entries.pop(xy_, None)
+
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+    def copy(self) -> HintCache:
+        """Returns a copy of the cache that can be updated independently (cached metrics are never modified)"""
+        cache = HintCache(self.max_tile_types)
+        cache.entries = OrderedDict((code, dict(entries)) for code, entries in self.entries.items())
+        return cache
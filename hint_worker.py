@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+import traceback
+from typing import Callable, List, Optional, Tuple
+
+from evaluator import PlacementEvaluation
+from grid import HexGrid, HintQuery
+from planner import BeamSearchPlanner, Plan
+from tile import HexTile
+
+
+HintCallback = Callable[[List[List[PlacementEvaluation]]], None]
+PlanCallback = Callable[[Plan], None]
+ErrorCallback = Callable[[Exception], None]
+
+
+def _compute_hints(snapshot: HexGrid, tile: HexTile, queries: List[HintQuery]) -> Tuple[HexGrid, List[List[PlacementEvaluation]]]:
+    return snapshot, snapshot.get_hints(tile, queries)
+
+
+def _compute_plan(snapshot: HexGrid, planner: BeamSearchPlanner, tiles: List[HexTile]) -> Tuple[HexGrid, Plan]:
+    return snapshot, planner.plan(snapshot, tiles)
+
+
+class HintWorker:
+    """
+    Computes hints and plans on a worker thread so that scoring large boards does not freeze the UI
+
+    Each request works on a snapshot of the board, and the results are handed to the callback on the
+    Tk thread by polling with after. Only the latest request is ever delivered: a newer request, a
+    call to cancel or any change to the board since the snapshot was taken discards the results.
+    Exceptions raised while computing are handed to the error callback instead, if there is one.
+    """
+
+    def __init__(self, widget, poll_interval: int = 20) -> None:
+        self.widget = widget # Any Tk widget, used to poll for results
+        self.poll_interval = poll_interval # Milliseconds
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.request_id = 0
+        self.future = None
+        self.board = None
+        self.callback = None
+        self.error_callback = None
+
+
+    def request(
+        self,
+        board: HexGrid,
+        tile: HexTile,
+        queries: List[HintQuery],
+        callback: HintCallback,
+        error_callback: Optional[ErrorCallback] = None
+    ) -> None:
+        """Starts computing the hints of several queries for a tile, replacing any pending request"""
+        self._submit(board, callback, error_callback, _compute_hints, tile, queries)
+
+
+    def request_plan(
+        self,
+        board: HexGrid,
+        planner: BeamSearchPlanner,
+        tiles: List[HexTile],
+        callback: PlanCallback,
+        error_callback: Optional[ErrorCallback] = None
+    ) -> None:
+        """Starts planning the placements of a queue of tiles, replacing any pending request"""
+        self._submit(board, callback, error_callback, _compute_plan, planner, tiles)
+
+
+    def _submit(self, board: HexGrid, callback, error_callback: Optional[ErrorCallback], function, *args) -> None:
+        self.cancel()
+        self.board = board
+        self.callback = callback
+        self.error_callback = error_callback
+        self.future = self.executor.submit(function, board.snapshot(), *args)
+        self.widget.after(self.poll_interval, self._poll, self.request_id)
+
+
+    def cancel(self) -> None:
+        """Discards the pending request, if any"""
+        self.request_id += 1
+        if self.future is not None:
+            self.future.cancel() # Only stops requests that have not started, others are ignored when done
+        self.future = None
+        self.board = None
+        self.callback = None
+        self.error_callback = None
+
+
+    def is_busy(self) -> bool:
+        return self.future is not None
+
+
+    def _poll(self, request_id: int) -> None:
+        if request_id != self.request_id:
+            return
+        if not self.future.done():
+            self.widget.after(self.poll_interval, self._poll, request_id)
+            return
+        board, callback, error_callback, future = self.board, self.callback, self.error_callback, self.future
+        self.future = self.board = self.callback = self.error_callback = None
+        try:
+            snapshot, result = future.result()
+        except Exception as error:
+            # Raising here would only be reported by Tk, leaving the UI waiting for the results
+            traceback.print_exc()
+            if error_callback is not None:
+                error_callback(error)
+            return
+        if snapshot.generation != board.generation:
+            return # The board changed while the results were computed
+        board.adopt_hint_cache(snapshot)
+        callback(result)
+
+
+    def shutdown(self) -> None:
+        self.cancel()
+        self.executor.shutdown(wait=False)
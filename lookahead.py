@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+from collections import Counter
+import numpy as np
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+from batch_evaluator import BatchPlacementEvaluator
+from evaluator import PlacementEvaluation
+from grid import HexGrid
+from hint_cache import DIRTY_OFFSETS
+from tile import HexTile, TileStatus, pack_edge_codes
+from utils import GridCoordinate
+
+
+class TileDistribution:
+    """A probability distribution over the tile types that can be drawn next"""
+
+    def __init__(self, tiles: List[HexTile], weights: Optional[List[float]] = None) -> None:
+        if weights is None:
+            weights = [1] * len(tiles)
+        total = sum(weights)
+        self.tiles = [tile.get_canonical() for tile in tiles]
+        self.probabilities = [weight / total for weight in weights]
+
+
+    @staticmethod
+    def from_board(board: HexGrid, max_tile_types: int = 8) -> TileDistribution:
+        """Estimates the distribution from the most common tile types already placed on a board"""
+        xs, ys = np.nonzero(board.edges.any(axis=2))
+        counts = Counter(HexTile.from_code(pack_edge_codes(codes)).canonical_code
+                         for codes in board.edges[xs, ys].tolist())
+        most_common = counts.most_common(max_tile_types)
+        return TileDistribution([HexTile.from_code(code) for code, _ in most_common],
+                                [count for _, count in most_common])
+
+
+    def __iter__(self):
+        return iter(zip(self.tiles, self.probabilities))
+
+
+    def __len__(self) -> int:
+        return len(self.tiles)
+
+
+class LookaheadEvaluation(NamedTuple):
+    """A placement with the expected score of the best placement of the next tile after it"""
+    evaluation: PlacementEvaluation
+    expected_next_score: float
+    value: float # Score of the placement plus the discounted expected next score
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+class Lookahead:
+    """
+    Ranks the placements of a tile by expectimax over the tiles that may be drawn after it
+
+    The candidates are the best placements by immediate score. Each is applied to the board and the
+    expected best score of the following placements is computed, taking the expectation over the tile
+    distribution and the maximum over placements, down to the given depth. Searches deepen one level
+    at a time and stop at the time budget, returning the results of the deepest completed level.
+
+    At depth 1 the best score of every frontier location is computed once per tile type on the
+    unchanged board. A placement only changes the scores within distance 2 of it, so only those
+    locations are rescored after applying a candidate.
+    """
+
+    def __init__(
+        self,
+        distribution: Optional[TileDistribution] = None,
+        depth: int = 1,
+        time_budget: float = 1.0,
+        num_candidates: int = 20,
+        branching: int = 3,
+        discount: float = 1.0
+    ) -> None:
+        self.distribution = distribution # Learned from the board if None
+        self.depth = depth
+        self.time_budget = time_budget # Seconds
+        self.num_candidates = num_candidates
+        self.branching = branching # Placements of each tile type searched below depth 1
+        self.discount = discount
+        self.deadline = None
+
+
+    def evaluate(self, board: HexGrid, tile: HexTile) -> List[LookaheadEvaluation]:
+        """Returns the candidate placements of a tile ranked by lookahead value, best first"""
+        search_board = self.get_search_board(board)
+        distribution = self.get_distribution(search_board)
+        candidates = self.get_candidates(search_board, tile)
+        results = self.rank(candidates, self.get_expected_scores(search_board, candidates, distribution))
+        return self.relocate(board, search_board, results)
+
+
+    def get_search_board(self, board: HexGrid) -> HexGrid:
+        """Returns a copy of the board with room for the search, so that the board itself is never enlarged"""
+        return board.get_search_copy(self.depth + 2)
+
+
+    def get_distribution(self, board: HexGrid) -> TileDistribution:
+        return self.distribution or TileDistribution.from_board(board)
+
+
+    def get_candidates(self, search_board: HexGrid, tile: HexTile) -> List[PlacementEvaluation]:
+        """Returns the placements to search from"""
+        return search_board.get_hint(tile, top_k=self.num_candidates)
+
+
+    def get_expected_scores(
+        self,
+        board: HexGrid,
+        candidates: List[PlacementEvaluation],
+        distribution: TileDistribution
+    ) -> List[float]:
+        """Returns the expected score of the placements after each candidate, within the time budget"""
+        return self.get_expected_scores_by_depth(board, candidates, distribution)[-1]
+
+
+    def get_expected_scores_by_depth(
+        self,
+        board: HexGrid,
+        candidates: List[PlacementEvaluation],
+        distribution: TileDistribution,
+        root_bests: Optional[List[List[Tuple[GridCoordinate, float]]]] = None
+    ) -> List[List[float]]:
+        """
+        Returns the expected scores after each candidate for every depth completed within the time budget
+
+        Depth 1 is always completed, and the root bests are computed if they are not given.
+        """
+        self.deadline = time.perf_counter() + self.time_budget
+        if root_bests is None:
+            root_bests = self.get_root_bests(board, distribution)
+        expected_scores = [self._get_expected_next_scores(board, candidates, distribution, root_bests)]
+        for depth in range(2, self.depth + 1):
+            try:
+                expected_scores.append([self._get_expected_score_after(board, evaluation, distribution, depth)
+                                        for evaluation in candidates])
+            except _OutOfTime:
+                break
+        return expected_scores
+
+
+    def rank(self, candidates: List[PlacementEvaluation], expected_scores: List[float]) -> List[LookaheadEvaluation]:
+        """Ranks candidates by their score plus the discounted expected score after them"""
+        results = [LookaheadEvaluation(evaluation, expected, evaluation.score + self.discount*expected)
+                   for evaluation, expected in zip(candidates, expected_scores)]
+        # Stable sort so that ties keep the order of the immediate scores
+        return sorted(results, key=lambda result: -result.value)
+
+
+    def relocate(
+        self,
+        board: HexGrid,
+        search_board: HexGrid,
+        results: List[LookaheadEvaluation]
+    ) -> List[LookaheadEvaluation]:
+        """Moves results from the locations of the search board to those of the board"""
+        return [result._replace(evaluation=result.evaluation._replace(
+                    xy=board.get_corresponding_xy(search_board, result.evaluation.xy))) for result in results]
+
+
+    def _get_best_scores(self, board: HexGrid, tile: HexTile, xys: List[GridCoordinate]) -> np.ndarray:
+        """Returns the best score of a tile type over its legal rotations at each location (-inf if none)"""
+        batch = BatchPlacementEvaluator(tile, xys, *board._get_neighbor_arrays(xys))
+        return np.where(batch.legal, batch.scores, -np.inf).max(axis=1)
+
+
+    def get_root_bests(self, board: HexGrid, distribution: TileDistribution) -> List[List[Tuple[GridCoordinate, float]]]:
+        """
+        Returns, for each tile type, the frontier locations with the best scores and their scores, best first
+
+        A placement changes the scores of at most len(DIRTY_OFFSETS) locations, so the best unchanged score
+        is always among the first len(DIRTY_OFFSETS) + 1 locations and the rest are dropped.
+        """
+        frontier = board.get_locations_with_status(TileStatus.VALID)
+        root_bests = []
+        for tile, _ in distribution:
+            scores = self._get_best_scores(board, tile, frontier)
+            order = np.argsort(-scores, kind="stable")[:len(DIRTY_OFFSETS) + 1]
+            root_bests.append([(frontier[index], float(scores[index])) for index in order])
+        return root_bests
+
+
+    def _get_expected_next_scores(
+        self,
+        board: HexGrid,
+        candidates: List[PlacementEvaluation],
+        distribution: TileDistribution,
+        root_bests: List[List[Tuple[GridCoordinate, float]]]
+    ) -> List[float]:
+        """Depth 1: returns the expected best score of the next placement after each candidate"""
+        expected_scores = []
+        for evaluation in candidates:
+            x, y = evaluation.xy
+            nearby = {(x+dx, y+dy) for dx, dy in DIRTY_OFFSETS}
+            board.apply(evaluation.xy, evaluation.tile)
+            try:
+                near_frontier = [xy for xy in nearby if board.statuses[xy] == TileStatus.VALID.value]
+                expected = 0
+                for (tile, probability), bests in zip(distribution, root_bests):
+                    # Scores further away are unchanged, so the best of them is the first one not nearby
+                    best = next((score for xy, score in bests if xy not in nearby), -np.inf)
+                    if near_frontier:
+                        best = max(best, self._get_best_scores(board, tile, near_frontier).max())
+                    expected += probability * (best if np.isfinite(best) else 0)
+            finally:
+                board.revert()
+            expected_scores.append(float(expected))
+        return expected_scores
+
+
+    def _get_expected_score_after(
+        self,
+        board: HexGrid,
+        evaluation: PlacementEvaluation,
+        distribution: TileDistribution,
+        depth: int
+    ) -> float:
+        board.apply(evaluation.xy, evaluation.tile)
+        try:
+            return self._get_expected_score(board, distribution, depth)
+        finally:
+            board.revert()
+
+
+    def _get_expected_score(self, board: HexGrid, distribution: TileDistribution, depth: int) -> float:
+        """Returns the expected value of the best placements of the next depth tiles"""
+        if depth == 0:
+            return 0
+        if time.perf_counter() > self.deadline:
+            raise _OutOfTime()
+        expected = 0
+        for tile, probability in distribution:
+            best = None
+            for evaluation in board.get_hint(tile, top_k=self.branching):
+                value = evaluation.score
+                if depth > 1:
+                    value += self.discount * self._get_expected_score_after(board, evaluation, distribution, depth-1)
+                best = value if best is None else max(best, value)
+            expected += probability * (0 if best is None else best)
+        return expected
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import os
+from typing import List, Optional, Tuple
+
+from batch_evaluator import BatchPlacementEvaluator
+from evaluator import PlacementEvaluation
+from grid import HexGrid
+from lookahead import Lookahead, LookaheadEvaluation, TileDistribution
+from tile import HexTile, TileStatus
+from utils import GridCoordinate
+
+
+PositionKey = Tuple[int, int] # Position hash and size of a board, which fix the location of every tile
+
+
+_worker_boards = {} # Position key -> board, the last one shipped to this worker process
+
+
+def _get_worker_board(key: PositionKey, board_data: Optional[bytes]) -> Optional[HexGrid]:
+    """Returns the board of a position in a worker, reading it if shipped, or None if it is not there"""
+    if key not in _worker_boards and board_data is not None:
+        _worker_boards.clear()
+        _worker_boards[key] = HexGrid.from_bytes(board_data)
+    return _worker_boards.get(key)
+
+
+def _score_chunk(
+    key: PositionKey,
+    board_data: Optional[bytes],
+    tile: HexTile,
+    xys: List[GridCoordinate]
+) -> Optional[np.ndarray]:
+    board = _get_worker_board(key, board_data)
+    if board is None:
+        return None
+    return BatchPlacementEvaluator(tile, xys, *board._get_neighbor_arrays(xys)).get_metrics()
+
+
+def _search_chunk(
+    key: PositionKey,
+    board_data: Optional[bytes],
+    lookahead: Lookahead,
+    candidates: List[PlacementEvaluation],
+    distribution: TileDistribution,
+    root_bests: List[List[Tuple[GridCoordinate, float]]]
+) -> Optional[List[List[float]]]:
+    board = _get_worker_board(key, board_data)
+    if board is None:
+        return None
+    return lookahead.get_expected_scores_by_depth(board, candidates, distribution, root_bests)
+
+
+def _split(items: list, num_chunks: int) -> List[list]:
+    """Splits a list into at most num_chunks contiguous chunks of nearly equal length"""
+    bounds = np.linspace(0, len(items), num_chunks + 1).astype(int)
+    return [items[start:stop] for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+class ProcessPoolBackend:
+    """
+    Spreads scoring and lookahead search over worker processes
+
+    Work is split into one contiguous chunk per worker. Workers keep the last board they were sent,
+    in the compact save file format, so a board is only shipped with the first tasks on a new
+    position and with any later task that lands on a worker without it. Results are merged in the
+    original order and ranked exactly like the serial path, so the output is the same. Lookahead
+    results are ranked at the deepest depth completed by every chunk. Small jobs are run in this
+    process.
+    """
+
+    def __init__(self, num_workers: Optional[int] = None, min_chunk_size: int = 64) -> None:
+        self.num_workers = num_workers or os.cpu_count()
+        self.min_chunk_size = min_chunk_size # Frontier locations per worker below which scoring is serial
+        self.executor = ProcessPoolExecutor(self.num_workers)
+        self.shipped_key = None # Key of the last board sent to the workers
+
+
+    def __enter__(self) -> ProcessPoolBackend:
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+
+
+    def shutdown(self) -> None:
+        self.executor.shutdown()
+
+
+    def _run_chunks(self, board: HexGrid, function, chunk_args: List[tuple]) -> list:
+        """Runs a function on each chunk in the workers, shipping the board only to workers without it"""
+        key = (board.position_hash(), board.size)
+        board_data = board.to_bytes() if key != self.shipped_key else None
+        self.shipped_key = key
+        futures = [self.executor.submit(function, key, board_data, *args) for args in chunk_args]
+        results = [future.result() for future in futures]
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            board_data = board_data or board.to_bytes()
+            futures = {index: self.executor.submit(function, key, board_data, *chunk_args[index]) for index in missing}
+            for index, future in futures.items():
+                results[index] = future.result()
+        return results
+
+
+    def _evaluate_all_placements(self, board: HexGrid, tile: HexTile) -> BatchPlacementEvaluator:
+        xys = board.get_locations_with_status(TileStatus.VALID)
+        num_chunks = min(self.num_workers, len(xys) // self.min_chunk_size)
+        if num_chunks <= 1:
+            return board._evaluate_all_placements(tile)
+        chunk_args = [(tile, chunk) for chunk in _split(xys, num_chunks)]
+        metrics = np.concatenate(self._run_chunks(board, _score_chunk, chunk_args))
+        return BatchPlacementEvaluator.from_metrics(tile, xys, metrics)
+
+
+    def rank_all_placements(self, board: HexGrid, tile: HexTile) -> List[PlacementEvaluation]:
+        """Same as HexGrid.rank_all_placements"""
+        batch = self._evaluate_all_placements(board, tile)
+        return [batch.get_evaluation(*placement) for placement in batch.get_ranking()]
+
+
+    def get_hint(self, board: HexGrid, tile: HexTile, top_k=None, threshold=None) -> List[PlacementEvaluation]:
+        """Same as HexGrid.get_hint"""
+        batch = self._evaluate_all_placements(board, tile)
+        return [batch.get_evaluation(*placement) for placement in batch.get_ranking(top_k, threshold)]
+
+
+    def evaluate_lookahead(self, board: HexGrid, tile: HexTile, lookahead: Lookahead) -> List[LookaheadEvaluation]:
+        """Same as Lookahead.evaluate, with the candidate placements split across the workers"""
+        search_board = lookahead.get_search_board(board)
+        distribution = lookahead.get_distribution(search_board)
+        candidates = lookahead.get_candidates(search_board, tile)
+        if not candidates:
+            return []
+        root_bests = lookahead.get_root_bests(search_board, distribution) # Shared by every chunk
+        chunk_args = [(lookahead, chunk, distribution, root_bests) for chunk in _split(candidates, self.num_workers)]
+        scores_by_depth = self._run_chunks(search_board, _search_chunk, chunk_args)
+        # Chunks may complete different depths within the time budget, and scores of different depths do not compare
+        depth = min(len(chunk_scores) for chunk_scores in scores_by_depth)
+        expected_scores = [score for chunk_scores in scores_by_depth for score in chunk_scores[depth - 1]]
+        return lookahead.relocate(board, search_board, lookahead.rank(candidates, expected_scores))
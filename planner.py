@@ -0,0 +1,68 @@
+import time
+from typing import List, NamedTuple
+
+from evaluator import PlacementEvaluation
+from grid import HexGrid
+from tile import HexTile
+
+
+class Plan(NamedTuple):
+    """A sequence of placements, one per tile of a queue, and the sum of their scores"""
+    placements: List[PlacementEvaluation]
+    score: float
+
+
+class BeamSearchPlanner:
+    """
+    Plans the placements of a known queue of tiles by beam search
+
+    Each step extends every plan in the beam with the best few placements of the next tile, by
+    immediate score, and keeps the best plans. Plans leading to the same board (for instance the same
+    two placements in either order) are merged using the board's position hash. The search stops
+    early at the time budget and returns the best plan found so far, which may cover fewer tiles.
+    """
+
+    def __init__(self, beam_width: int = 8, branching: int = 5, time_budget: float = 0.8) -> None:
+        self.beam_width = beam_width
+        self.branching = branching # Placements of each tile tried from every plan in the beam
+        self.time_budget = time_budget # Seconds
+
+
+    def plan(self, board: HexGrid, tiles: List[HexTile]) -> Plan:
+        """
+        Returns the best plan found for placing the tiles in order
+
+        The search runs on a copy of the board with room for every tile of the plan, so the board is
+        left unchanged. The returned locations are those of the board, and the locations of later
+        steps may lie beyond its current border.
+        """
+        deadline = time.perf_counter() + self.time_budget
+        search_board = board.get_search_copy(len(tiles) + 2)
+        beam = [Plan([], 0)]
+        for tile in tiles:
+            expansions = {} # position hash -> best plan reaching it
+            for plan in beam:
+                if time.perf_counter() > deadline:
+                    break
+                for placement in plan.placements:
+                    search_board.apply(placement.xy, placement.tile)
+                try:
+                    for evaluation in search_board.get_hint(tile, top_k=self.branching):
+                        search_board.apply(evaluation.xy, evaluation.tile)
+                        position_hash = search_board.position_hash()
+                        search_board.revert()
+                        score = plan.score + evaluation.score
+                        if position_hash not in expansions or score > expansions[position_hash].score:
+                            expansions[position_hash] = Plan(plan.placements + [evaluation], score)
+                finally:
+                    for _ in plan.placements:
+                        search_board.revert()
+            if not expansions:
+                break
+            # Stable sort so that ties keep the order of the scorer
+            beam = sorted(expansions.values(), key=lambda plan: -plan.score)[:self.beam_width]
+            if time.perf_counter() > deadline:
+                break
+        best = beam[0]
+        return Plan([placement._replace(xy=board.get_corresponding_xy(search_board, placement.xy))
+                     for placement in best.placements], best.score)
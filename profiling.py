@@ -0,0 +1,100 @@
+import functools
+import importlib
+import json
+import numpy as np
+import time
+from typing import Dict, List, Tuple
+
+
+"""
+Opt-in timing of the hot paths of a session
+
+Nothing is patched until the profiler is enabled, so there is no overhead when it is off. Enabling it
+wraps every registered method with a timer, and disabling it restores the original methods.
+"""
+DEFAULT_TARGETS = [("grid", "HexGrid", "get_hint"),
+                   ("grid", "HexGrid", "get_hints"), # Used by the app's background hints
+                   ("grid", "HexGrid", "rank_all_placements"),
+                   ("grid", "HexGrid", "place_tile"),
+                   ("grid", "HexGrid", "update_neighbors_status"),
+                   ("grid", "HexGrid", "_enlarge_board"),
+                   ("grid_canvas", "HexGridCanvas", "draw"),
+                   ("grid_canvas", "HexGridCanvas", "get_xy_from_pix")]
+
+
+class Profiler:
+    """Records the call count and duration of every call to a set of methods"""
+
+    def __init__(self, targets: List[Tuple[str, str, str]] = DEFAULT_TARGETS) -> None:
+        self.targets = targets # (module, class, method) names
+        self.originals = {} # (class, method name) -> original function
+        self.durations = {} # "Class.method" -> durations in seconds
+
+
+    def is_enabled(self) -> bool:
+        return bool(self.originals)
+
+
+    def _wrap(self, name: str, method):
+        durations = self.durations.setdefault(name, [])
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                durations.append(time.perf_counter() - start)
+        return timed
+
+
+    def enable(self) -> None:
+        """Starts timing the registered methods"""
+        if self.is_enabled():
+            return
+        for module_name, class_name, method_name in self.targets:
+            cls = getattr(importlib.import_module(module_name), class_name)
+            method = cls.__dict__[method_name]
+            self.originals[(cls, method_name)] = method
+            setattr(cls, method_name, self._wrap("{}.{}".format(class_name, method_name), method))
+
+
+    def disable(self) -> None:
+        """Restores the original methods, keeping the recorded timings"""
+        for (cls, method_name), method in self.originals.items():
+            setattr(cls, method_name, method)
+        self.originals = {}
+
+
+    def reset(self) -> None:
+        for durations in self.durations.values():
+            durations.clear()
+
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Returns the call count and the total, mean and percentile durations (in ms) of every method"""
+        stats = {}
+        for name, durations in self.durations.items():
+            if not durations:
+                continue
+            milliseconds = 1000 * np.array(durations)
+            stats[name] = {"count": len(durations),
+                           "total_ms": float(milliseconds.sum()),
+                           "mean_ms": float(milliseconds.mean()),
+                           "p50_ms": float(np.percentile(milliseconds, 50)),
+                           "p90_ms": float(np.percentile(milliseconds, 90)),
+                           "p99_ms": float(np.percentile(milliseconds, 99)),
+                           "max_ms": float(milliseconds.max())}
+        return stats
+
+
+    def format_stats(self) -> str:
+        """Returns one line per method, most total time first"""
+        stats = sorted(self.get_stats().items(), key=lambda item: -item[1]["total_ms"])
+        return "\n".join("{}: {} calls, {:.1f} ms total, p50 {:.2f} ms, p99 {:.2f} ms".format(
+            name, entry["count"], entry["total_ms"], entry["p50_ms"], entry["p99_ms"]) for name, entry in stats)
+
+
+    def dump(self, file_name: str) -> None:
+        """Writes the statistics to a JSON file"""
+        with open(file_name, "w") as file:
+            json.dump(self.get_stats(), file, indent=2)
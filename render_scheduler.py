@@ -0,0 +1,34 @@
+from typing import Callable, Hashable
+
+
+class RenderScheduler:
+    """
+    Coalesces redraw requests so that each canvas is drawn at most once per event loop turn
+
+    Requests mark a canvas as dirty and the redraws are flushed together once Tk is idle. A later
+    request for the same canvas replaces the pending one.
+    """
+
+    def __init__(self, widget) -> None:
+        self.widget = widget # Any Tk widget, used to schedule the flush
+        self.pending = {} # canvas -> draw callback
+        self.flush_id = None
+        self.num_requested = 0
+        self.num_performed = 0
+
+
+    def request(self, canvas: Hashable, draw: Callable[[], None]) -> None:
+        """Marks a canvas as needing a redraw"""
+        self.num_requested += 1
+        self.pending[canvas] = draw
+        if self.flush_id is None:
+            self.flush_id = self.widget.after_idle(self.flush)
+
+
+    def flush(self) -> None:
+        """Performs all pending redraws"""
+        self.flush_id = None
+        pending, self.pending = self.pending, {}
+        for draw in pending.values():
+            draw()
+            self.num_performed += 1
@@ -0,0 +1,118 @@
+import numpy as np
+import pickle
+from typing import Tuple
+
+
+"""
+Save files are a fixed header followed by one record per non-empty tile:
+
+    header: magic (4 bytes), format version (uint16), board size (uint32), number of tiles (uint32)
+    record: x, y relative to the origin tile (int16 each), the six edge codes (uint8 each)
+
+All values are little endian. Older save files are pickles, and are still read by read_legacy_board.
+"""
+SAVE_MAGIC = b"DORF"
+SAVE_VERSION = 1
+
+HEADER_DTYPE = np.dtype([("magic", "S4"), ("version", "<u2"), ("size", "<u4"), ("num_tiles", "<u4")])
+RECORD_DTYPE = np.dtype([("x", "<i2"), ("y", "<i2"), ("edges", "u1", (6,))])
+
+
+class SaveFormatError(Exception):
+    pass
+
+
+def make_records(xs: np.ndarray, ys: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Packs relative tile locations and their edge codes into an array of save records"""
+    records = np.empty(len(xs), dtype=RECORD_DTYPE)
+    records["x"] = xs
+    records["y"] = ys
+    records["edges"] = edges
+    return records
+
+
+def _make_header(size: int, num_tiles: int) -> np.ndarray:
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header["magic"] = SAVE_MAGIC
+    header["version"] = SAVE_VERSION
+    header["size"] = size
+    header["num_tiles"] = num_tiles
+    return header
+
+
+def _check_header(header: np.ndarray) -> None:
+    if len(header) == 0 or header["magic"][0] != SAVE_MAGIC:
+        raise SaveFormatError("Not a board save file")
+    if header["version"][0] > SAVE_VERSION:
+        raise SaveFormatError("Unsupported save file version {}".format(header["version"][0]))
+
+
+def write_board(file_name: str, size: int, records: np.ndarray) -> None:
+    """Writes a board to a save file"""
+    with open(file_name, "wb") as file:
+        file.write(encode_board(size, records))
+
+
+def encode_board(size: int, records: np.ndarray) -> bytes:
+    """Returns the contents of a save file for a board"""
+    return _make_header(size, len(records)).tobytes() + records.astype(RECORD_DTYPE).tobytes()
+
+
+def is_board_save_file(file_name: str) -> bool:
+    """Checks if a file uses the binary save format (rather than the older pickles)"""
+    with open(file_name, "rb") as file:
+        return file.read(len(SAVE_MAGIC)) == SAVE_MAGIC
+
+
+def read_board(file_name: str) -> Tuple[int, np.ndarray]:
+    """Returns the board size and the tile records of a save file, memory mapped from the file"""
+    header = np.fromfile(file_name, dtype=HEADER_DTYPE, count=1)
+    _check_header(header)
+    num_tiles = int(header["num_tiles"][0])
+    if num_tiles == 0:
+        return int(header["size"][0]), np.empty(0, dtype=RECORD_DTYPE) # Empty files cannot be mapped
+    records = np.memmap(file_name, dtype=RECORD_DTYPE, mode="r", offset=HEADER_DTYPE.itemsize, shape=(num_tiles,))
+    return int(header["size"][0]), records
+
+
+def decode_board(data: bytes) -> Tuple[int, np.ndarray]:
+    """Returns the board size and the tile records from the contents of a save file"""
+    header = np.frombuffer(data, dtype=HEADER_DTYPE, count=1)
+    _check_header(header)
+    num_tiles = int(header["num_tiles"][0])
+    records = np.frombuffer(data, dtype=RECORD_DTYPE, count=num_tiles, offset=HEADER_DTYPE.itemsize)
+    return int(header["size"][0]), records
+
+
+class _LegacyHexTile:
+    """Stand-in for the mutable tile objects pickled into older save files"""
+
+
+class _LegacySaveUnpickler(pickle.Unpickler):
+    """Unpickles older save files, refusing anything but the arrays, enums and tiles they contain"""
+
+    ALLOWED_CLASSES = {("numpy", "ndarray"),
+                       ("numpy", "dtype"),
+                       ("numpy.core.multiarray", "_reconstruct"),
+                       ("numpy._core.multiarray", "_reconstruct"),
+                       ("copyreg", "_reconstructor"),
+                       ("builtins", "object"),
+                       ("edge", "Edge"),
+                       ("tile", "TileStatus")}
+
+    def find_class(self, module: str, name: str):
+        if (module, name) == ("tile", "HexTile"):
+            return _LegacyHexTile
+        if (module, name) not in self.ALLOWED_CLASSES:
+            raise pickle.UnpicklingError("Unexpected object in save file: {}.{}".format(module, name))
+        return super().find_class(module, name)
+
+
+def read_legacy_board(file_name: str) -> np.ndarray:
+    """Returns the (size, size, 6) array of edge codes stored in an older, pickled save file"""
+    with open(file_name, "rb") as file:
+        edges = _LegacySaveUnpickler(file).load()
+    if edges.dtype == object:
+        # The oldest save files hold an array of tile objects
+        edges = np.array([[[edge.code for edge in tile.edges] for tile in row] for row in edges], dtype=np.uint8)
+    return edges
@@ -0,0 +1,92 @@
+import random
+from typing import Callable, Dict, NamedTuple, Optional
+
+from edge import Edge
+from evaluator import PlacementEvaluation
+from grid import HexGrid
+from tile import HexTile
+
+
+# Rough frequencies of the edges on drawn tiles
+DEFAULT_EDGE_WEIGHTS = {Edge.GRASS: 8,
+                        Edge.TREES: 6,
+                        Edge.HOUSE: 5,
+                        Edge.CROPS: 4,
+                        Edge.RIVER: 1,
+                        Edge.TRAIN: 1,
+                        Edge.WATER: 1,
+                        Edge.STATION: 1}
+
+
+class TileGenerator:
+    """Draws random tiles, picking every edge independently with the given weights"""
+
+    def __init__(self, edge_weights: Optional[Dict[Edge, float]] = None, seed: Optional[int] = None) -> None:
+        edge_weights = edge_weights or DEFAULT_EDGE_WEIGHTS
+        self.edges = [edge for edge, weight in edge_weights.items() if weight > 0]
+        self.weights = [edge_weights[edge] for edge in self.edges]
+        self.rng = random.Random(seed)
+
+
+    def next_tile(self) -> HexTile:
+        return HexTile(self.rng.choices(self.edges, weights=self.weights, k=6))
+
+
+class SimulationResult(NamedTuple):
+    num_placed: int
+    num_skipped: int # Tiles without any legal placement
+    total_score: float
+
+
+class Simulator:
+    """
+    Plays games without the GUI, through the same HexGrid calls as the app
+
+    The greedy policy places every tile at the best placement of get_hint, the random policy at a
+    uniformly chosen legal placement.
+    """
+
+    POLICIES = ["greedy", "random"]
+
+    def __init__(
+        self,
+        board: Optional[HexGrid] = None,
+        generator: Optional[TileGenerator] = None,
+        policy: str = "greedy",
+        seed: Optional[int] = None
+    ) -> None:
+        assert policy in self.POLICIES
+        self.board = board or HexGrid()
+        self.generator = generator or TileGenerator(seed=seed)
+        self.policy = policy
+        self.rng = random.Random(seed)
+
+
+    def choose_placement(self, tile: HexTile) -> Optional[PlacementEvaluation]:
+        """Returns the placement of a tile chosen by the policy, or None if it cannot be placed"""
+        if self.policy == "greedy":
+            hint = self.board.get_hint(tile, top_k=1)
+            return hint[0] if hint else None
+        placements = self.board.rank_all_placements(tile)
+        return self.rng.choice(placements) if placements else None
+
+
+    def play(
+        self,
+        num_tiles: int,
+        on_step: Optional[Callable[[int, Optional[PlacementEvaluation]], None]] = None
+    ) -> SimulationResult:
+        """Draws and places a number of tiles, calling on_step with the step and placement after each"""
+        num_placed = num_skipped = 0
+        total_score = 0
+        for step in range(num_tiles):
+            placement = self.choose_placement(self.generator.next_tile())
+            if placement is None:
+                num_skipped += 1
+            else:
+                self.board.place_tile(placement.xy, placement.tile)
+                num_placed += 1
+                total_score += placement.score
+            if on_step is not None:
+                on_step(step, placement)
+        return SimulationResult(num_placed, num_skipped, total_score)
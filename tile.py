@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 from enum import Enum, auto
-from typing import Optional, List, Iterator
+from typing import Optional, List, Tuple
+import numpy as np
 
-from edge import Edge, Connection
+from edge import Edge, EDGES_BY_CODE
 from utils import Color, EdgeIndex
 
 
@@ -25,101 +26,229 @@ class TileStatus(Enum):
         return self.__COLORS__[self.value]
 
 
+TILE_STATUSES_BY_VALUE = {status.value: status for status in TileStatus}
+
+
+def pack_edge_codes(codes: List[int]) -> int:
+    """Packs the codes of six edges into a single integer, four bits per edge"""
+    code = 0
+    for index, edge_code in enumerate(codes):
+        code |= edge_code << (4*index)
+    return code
+
+
+def rotate_packed_code(code: int, index: int) -> int:
+    """Rotates a packed code so that edge `index` comes first, like edges[index:] + edges[:index]"""
+    shift = 4*index
+    return ((code >> shift) | (code << (24 - shift))) & 0xFFFFFF
+
+
 class HexTile:
+    """
+    An immutable tile value
+
+    Tiles are interned: constructing a tile with the same edges returns the same object. Every
+    tile knows its packed 6-edge code and the code of its canonical form (its minimal rotation).
+    """
+    __slots__ = ("edges", "code", "canonical_code")
+
     EMPTY_EDGES = 6 * [Edge.EMPTY]
     ORIGIN_EDGES = 6 * [Edge.GRASS]
 
+    __INTERNED__ = {}
 
-    def __init__(self, edges: Optional[List[Edge]] = None) -> None:
+
+    def __new__(cls, edges: Optional[List[Edge]] = None) -> HexTile:
         if edges is None:
-            self.clear_edges()
-        else:
-            self.edges = edges.copy()
-        self.clear_status()
+            edges = HexTile.EMPTY_EDGES
+        code = pack_edge_codes([edge.code for edge in edges])
+        tile = cls.__INTERNED__.get(code)
+        if tile is None:
+            tile = object.__new__(cls)
+            object.__setattr__(tile, "edges", tuple(edges))
+            object.__setattr__(tile, "code", code)
+            object.__setattr__(tile, "canonical_code", min(rotate_packed_code(code, i) for i in range(6)))
+            cls.__INTERNED__[code] = tile
+        return tile
+
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError("HexTile is immutable")
+
+
+    def __reduce__(self):
+        return (HexTile, (list(self.edges),))
 
 
     def __eq__(self, other: HexTile) -> bool:
-        if (isinstance(other, HexTile)):
-            return self.edges == other.edges
+        if (isinstance(other, (HexTile, HexTileView))):
+            return self.code == other.code
         return False
 
 
+    def __hash__(self) -> int:
+        return self.code
+
+
+    @staticmethod
+    def from_code(code: int) -> HexTile:
+        """Returns the tile with the given packed code"""
+        tile = HexTile.__INTERNED__.get(code)
+        if tile is None:
+            tile = HexTile([Edge.from_code((code >> (4*index)) & 0xF) for index in range(6)])
+        return tile
+
+
     def get_edges(self) -> List[Edge]:
-        return self.edges.copy()
+        return list(self.edges)
 
 
     def get_edge(self, index: EdgeIndex) -> Edge:
         return self.edges[index]
 
 
-    def set_edges(self, edges: List[Edge]) -> None:
-        self.edges = edges.copy()
+    def with_edge(self, edge: Edge, index: EdgeIndex) -> HexTile:
+        """Returns the tile with one edge replaced"""
+        edges = list(self.edges)
+        edges[index] = edge
+        return HexTile(edges)
+
+
+    def is_empty(self) -> bool:
+        return self.code == 0
+
+
+    def rotated(self, clockwise: bool = True) -> HexTile:
+        """Returns the tile rotated by one edge"""
+        return HexTile.from_code(rotate_packed_code(self.code, 5 if clockwise else 1))
+
+
+    def get_canonical(self) -> HexTile:
+        """Returns the canonical form of the tile, shared by all of its rotations"""
+        return HexTile.from_code(self.canonical_code)
+
+
+    def get_rotation_table(self) -> TileRotations:
+        return TileRotations.get(self.canonical_code)
+
+
+    def get_all_rotations(self) -> Tuple[HexTile, ...]:
+        """Returns all distinct rotations of the tile, in the same order for every rotation of it"""
+        return self.get_rotation_table().tiles
+
 
+    def get_num_symmetries(self) -> int:
+        """Returns the number of rotations that leave the tile unchanged"""
+        return self.get_rotation_table().num_symmetries
 
-    def set_edge(self, edge: Edge, index: EdgeIndex) -> None:
-        self.edges[index] = edge
 
+class TileRotations:
+    """
+    The distinct rotations of a tile type, starting from its canonical form
 
-    def clear_edges(self) -> None:
-        self.edges = HexTile.EMPTY_EDGES
+    Tables are memoized per canonical code, so repeated queries for the same tile type allocate nothing.
+    """
+    __slots__ = ("canonical_code", "tiles", "codes", "edge_codes", "num_symmetries")
 
+    __TABLES__ = {}
 
-    def update_status(self, neighborTiles: Optional[List[HexTile]]) -> None:
-        """Computes the status of the tile given the edges of the neighboring tiles"""
-        self.num_good_connections = 0
-        self.num_bad_connections = 0
-        self.num_empty_neighbors = 0
-        if neighborTiles is None:
-            self.status = TileStatus.EMPTY if self.is_empty() else TileStatus.GOOD
-            return
-        # Gather statistics
-        for index, neighborTile in enumerate(neighborTiles):
-            index_ = (index + 3) % 6
-            edge = self.edges[index]
-            edge_ = neighborTile.edges[index_]
-            if neighborTile.is_empty():
-                self.num_empty_neighbors += 1
-            elif not Connection(edge, edge_).is_good() and not edge_ == Edge.EMPTY:
-                self.num_bad_connections += 1
-            else:
-                self.num_good_connections += 1
-        # Determine tile status
-        if self.is_empty() and self.num_empty_neighbors == 6:
-            self.status = TileStatus.EMPTY
-        elif self.is_empty():
-            self.status = TileStatus.VALID
-        elif self.num_good_connections == 6:
-            self.status = TileStatus.PERFECT
-        elif self.num_bad_connections > 0:
-            self.status = TileStatus.BAD
-        else:
-            self.status = TileStatus.GOOD
 
+    def __init__(self, canonical_code: int) -> None:
+        codes = []
+        for index in range(6):
+            code = rotate_packed_code(canonical_code, index)
+            if code in codes:
+                break # The rotations repeat from here on
+            codes.append(code)
+        self.canonical_code = canonical_code
+        self.codes = tuple(codes)
+        self.tiles = tuple(HexTile.from_code(code) for code in codes)
+        self.edge_codes = np.array([[edge.code for edge in tile.edges] for tile in self.tiles], dtype=np.uint8)
+        self.edge_codes.flags.writeable = False
+        self.num_symmetries = 6 // len(codes)
 
-    def clear_status(self) -> None:
-        self.update_status(None)
+
+    @staticmethod
+    def get(canonical_code: int) -> TileRotations:
+        table = TileRotations.__TABLES__.get(canonical_code)
+        if table is None:
+            table = TileRotations.__TABLES__[canonical_code] = TileRotations(canonical_code)
+        return table
+
+
+    def index(self, tile: HexTile) -> int:
+        """Returns the position of a rotation of this tile type in the table"""
+        return self.codes.index(tile.code)
+
+
+class HexTileView:
+    """
+    A read-only view of one location of a HexGrid
+
+    The grid stores its tiles as parallel arrays of edge codes, statuses and connection counters.
+    A view exposes one location of those arrays through the same API as HexTile.
+    """
+    __slots__ = ("grid", "xy")
+
+
+    def __init__(self, grid, xy: Tuple[int, int]) -> None:
+        self.grid = grid
+        self.xy = xy
+
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (HexTile, HexTileView)):
+            return self.code == other.code
+        return False
+
+
+    @property
+    def edges(self) -> List[Edge]:
+        return [EDGES_BY_CODE[code] for code in self.grid.edges[self.xy].tolist()]
+
+
+    def get_edges(self) -> List[Edge]:
+        return self.edges
+
+
+    def get_edge(self, index: EdgeIndex) -> Edge:
+        x, y = self.xy
+        return EDGES_BY_CODE[self.grid.edges[x, y, index]]
 
 
     def get_status(self) -> TileStatus:
-        return self.status
+        return TILE_STATUSES_BY_VALUE[self.grid.statuses[self.xy]]
 
 
-    def is_empty(self) -> bool:
-        return self.get_edges() == HexTile.EMPTY_EDGES
+    @property
+    def status(self) -> TileStatus:
+        return self.get_status()
+
+
+    @property
+    def num_good_connections(self) -> int:
+        return int(self.grid.num_good_connections[self.xy])
 
 
-    def rotate(self, clockwise: bool = True) -> None:
-        edges = self.get_edges()
-        if clockwise:
-            self.set_edges(edges[5:] + edges[:5])
-        else:
-            self.set_edges(edges[1:] + edges[:1])
+    @property
+    def num_bad_connections(self) -> int:
+        return int(self.grid.num_bad_connections[self.xy])
+
+
+    @property
+    def num_empty_neighbors(self) -> int:
+        return int(self.grid.num_empty_neighbors[self.xy])
+
+
+    @property
+    def code(self) -> int:
+        return pack_edge_codes(self.grid.edges[self.xy].tolist())
+
+
+    def is_empty(self) -> bool:
+        return not self.grid.edges[self.xy].any()
 
 
-    def get_all_rotations(self) -> List[HexTile]:
-        """Generates a list of all posible rotations of the tile"""
-        rotations = []
-        for i in range(6):
-            rotations.append(tuple(self.edges[i:] + self.edges[:i]))
-        rotations = list(set(rotations)) # Remove duplicate rotations
-        return [HexTile(list(edges)) for edges in rotations]
+    def to_tile(self) -> HexTile:
+        """Returns the tile value at this location"""
+        return HexTile.from_code(self.code)
@@ -1,25 +1,26 @@
 from tkinter import Canvas
-from math import sin, cos, pi
+from math import sin, cos, pi, atan2, floor
 from typing import Optional, List, Tuple
 
 from edge import Edge
 from tile import HexTile
 
-from utils import Color, is_point_inside_polygon, PixelCoordinate, EdgeIndex
+from render_scheduler import RenderScheduler
+from utils import Color, PixelCoordinate, EdgeIndex
 
 
 class HexTileCanvas(Canvas):
     """Class to draw the preview of the hex tile to be placed onto the Dorfromantik board"""
 
-    def __init__(self, master, size: int, *args, **kwargs) -> None:
+    def __init__(self, master, size: int, scheduler: Optional[RenderScheduler] = None, *args, **kwargs) -> None:
         super().__init__(master, background='white', width=size, height=size, *args, **kwargs)
         self.size = size
+        self.scheduler = scheduler
         self.selected_slice = None
-        self.tile = HexTile()
-        self.tile.set_edges(HexTile.ORIGIN_EDGES)
+        self.tile = HexTile(HexTile.ORIGIN_EDGES)
         self.neighbors = HexTile()
         self.select_slice(0)
-        self.draw()
+        self.request_draw()
 
 
     def _get_vertex_angle(self, index: EdgeIndex) -> float:
@@ -40,11 +41,17 @@ class HexTileCanvas(Canvas):
 
     def _get_slice_index_from_xy(self, xy: PixelCoordinate) -> Optional[EdgeIndex]:
         """Returns the index of the slice containing a point on the canvas, if any"""
-        for index in range(6):
-            vertices = self._get_slice_vertices(index)
-            if is_point_inside_polygon(xy, vertices):
-                return index
-        return None
+        r = self.size / 3 # radius
+        offset = self.size / 2
+        dx, dy = xy[0] - offset, offset - xy[1]
+        # Slice i lies between the vertex angles of i and i+1, which decrease by pi/3 from 7pi/6
+        angle = atan2(dy, dx)
+        index = floor(3.5 - 3*angle/pi) % 6
+        # The point is inside the hexagon if its distance along the slice's bisector is within the apothem
+        bisector_angle = pi * (1 - index/3)
+        if dx*cos(bisector_angle) + dy*sin(bisector_angle) > r * cos(pi/6):
+            return None
+        return index
     
 
     def _draw_slice(
@@ -93,10 +100,22 @@ class HexTileCanvas(Canvas):
             self._draw_slice(self.selected_slice, border_color=Color.YELLOW)
 
 
+    def request_draw(self) -> None:
+        """Draws the canvas, or schedules the draw if the canvas has a render scheduler"""
+        if self.scheduler is None:
+            self.draw()
+        else:
+            self.scheduler.request(self, self.draw)
+
+
     def get_tile(self) -> HexTile:
         return self.tile
 
 
+    def set_tile(self, tile: HexTile) -> None:
+        self.tile = tile
+
+
     def select_slice(self, index: EdgeIndex) -> None:
         self.selected_slice = index
 
@@ -111,31 +130,31 @@ class HexTileCanvas(Canvas):
 
     def select_all(self) -> None:
         self.selected_slice = -1
-        self.draw()
+        self.request_draw()
 
 
     def set_selected_edge(self, edge: Edge, auto_advance = True) -> None:
         """Sets the currently selected edge (or all edges)"""
         if self.selected_slice == -1:
-            self.tile.set_edges(6*[edge])
+            self.tile = HexTile(6*[edge])
         else:
-            self.tile.set_edge(edge, self.selected_slice)
+            self.tile = self.tile.with_edge(edge, self.selected_slice)
             if auto_advance:
                 self.select_next()
-        self.draw()
+        self.request_draw()
 
 
     def set_neighbors(self, neighbors: HexTile) -> None:
         self.neighbors = neighbors
-        self.draw()
+        self.request_draw()
 
 
     def rotate(self, clockwise = True) -> None:
         """Rotates the edges on the tile, as well as the selected tile"""
-        self.tile.rotate(clockwise)
+        self.tile = self.tile.rotated(clockwise)
         if not self.selected_slice == -1:
             self.select_next() if clockwise else self.select_prev()
-        self.draw()
+        self.request_draw()
         
 
     def on_click(self, event) -> None:
@@ -145,4 +164,4 @@ class HexTileCanvas(Canvas):
             return
         # print("Selected slice: ", index)
         self.select_slice(index)
-        self.draw()
+        self.request_draw()
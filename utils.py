@@ -1,7 +1,5 @@
 import os
-from typing import Tuple, List
-from shapely.geometry import Point
-from shapely.geometry.polygon import Polygon
+from typing import Tuple
 
 
 EdgeIndex = int
@@ -9,8 +7,17 @@ GridCoordinate = Tuple[int, int]
 PixelCoordinate = Tuple[float, float]
 
 
-def is_point_inside_polygon(point: PixelCoordinate, polygon: List[PixelCoordinate]) -> bool:
-    return Polygon(polygon).contains(Point(point))
+def round_axial(x: float, y: float) -> GridCoordinate:
+    """Rounds fractional axial coordinates to the coordinates of the hexagon containing them"""
+    z = -x - y
+    rx, ry, rz = round(x), round(y), round(z)
+    # The coordinate with the largest rounding error is recomputed from the other two
+    dx, dy, dz = abs(rx - x), abs(ry - y), abs(rz - z)
+    if dx > dy and dx > dz:
+        rx = -ry - rz
+    elif dy > dz:
+        ry = -rx - rz
+    return int(rx), int(ry)
 
 
 class Color:
@@ -37,4 +44,4 @@ class Color:
 PARENT_DIR = os.path.dirname(__file__)
 SAVE_DIR = os.path.join(PARENT_DIR, "saves/")
 MANUAL_SAVE_FILEPATH = os.path.join(SAVE_DIR, "manual.p")
-AUTO_SAVE_FILEPATH = os.path.join(SAVE_DIR, "auto.p")
\ No newline at end of file
+PROFILE_FILEPATH = os.path.join(SAVE_DIR, "profile.json")
\ No newline at end of file
@@ -0,0 +1,36 @@
+from functools import lru_cache
+from typing import Tuple
+
+
+"""
+Zobrist hashing of board positions
+
+The hash of a position is the XOR of one 64 bit key per non-empty edge, keyed by the location of the
+tile relative to the origin tile, the edge slot and the edge code. Placing or removing a tile XORs its
+keys in or out, and since locations are relative, enlarging the board does not change the hash.
+Keys are derived with splitmix64 rather than drawn from a table, so locations are unbounded.
+"""
+MASK_64 = (1 << 64) - 1
+
+
+def splitmix64(value: int) -> int:
+    """Mixes a 64 bit integer into a well distributed 64 bit hash"""
+    z = (value + 0x9E3779B97F4A7C15) & MASK_64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return z ^ (z >> 31)
+
+
+def get_edge_key(x: int, y: int, slot: int, code: int) -> int:
+    """Returns the key of an edge code in a slot of the tile at a (relative) location"""
+    return splitmix64(((x & 0xFFFFFF) << 40) | ((y & 0xFFFFFF) << 16) | (slot << 8) | code)
+
+
+@lru_cache(maxsize=1 << 16)
+def get_tile_key(x: int, y: int, codes: Tuple[int, ...]) -> int:
+    """Returns the combined key of the edge codes of a tile at a (relative) location (0 if it is empty)"""
+    key = 0
+    for slot, code in enumerate(codes):
+        if code:
+            key ^= get_edge_key(x, y, slot, code)
+    return key